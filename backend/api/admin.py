@@ -2,6 +2,8 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import F
+from .authentication import invalidate_users
 from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment
 
 
@@ -32,12 +34,16 @@ class UserAdmin(BaseUserAdmin):
     actions = ['approve_students', 'reject_students']
     
     def approve_students(self, request, queryset):
-        count = queryset.filter(role=User.STUDENT).update(is_approved=True)
+        students = queryset.filter(role=User.STUDENT)
+        invalidate_users(list(students.values_list('pk', flat=True)))
+        count = students.update(is_approved=True, token_version=F('token_version') + 1)
         self.message_user(request, f'{count} student(s) approved successfully.')
     approve_students.short_description = 'Approve selected students'
     
     def reject_students(self, request, queryset):
-        count = queryset.filter(role=User.STUDENT).update(is_approved=False)
+        students = queryset.filter(role=User.STUDENT)
+        invalidate_users(list(students.values_list('pk', flat=True)))
+        count = students.update(is_approved=False, token_version=F('token_version') + 1)
         self.message_user(request, f'{count} student(s) marked as pending.')
     reject_students.short_description = 'Mark as pending'
 
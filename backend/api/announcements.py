@@ -0,0 +1,43 @@
+"""
+Campus Connect - Announcement fan-out
+
+Writes one Notification per recipient in bulk_create batches. Runs as a
+background task; a retried delivery resumes after the last batch sent.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import realtime
+from .models import Announcement, Notification
+
+
+def deliver(announcement_id):
+    announcement = Announcement.objects.get(pk=announcement_id)
+    recipients = list(announcement.recipients().order_by('pk').values_list('pk', flat=True).distinct())
+
+    Announcement.objects.filter(pk=announcement_id).update(status=Announcement.SENDING, total=len(recipients))
+
+    # Batches commit together with `sent`, so it marks where to resume
+    size = settings.ANNOUNCEMENT_BATCH_SIZE
+    for start in range(announcement.sent, len(recipients), size):
+        send_batch(announcement, recipients[start:start + size])
+
+    Announcement.objects.filter(pk=announcement_id).update(status=Announcement.DONE, finished_at=timezone.now())
+
+
+def send_batch(announcement, user_ids):
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                title=announcement.title,
+                message=announcement.message,
+                notification_type=announcement.notification_type
+            )
+            for user_id in user_ids
+        ])
+        Announcement.objects.filter(pk=announcement.pk).update(sent=F('sent') + len(user_ids))
+        realtime.publish_notifications(notifications)
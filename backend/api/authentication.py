@@ -0,0 +1,143 @@
+"""
+Campus Connect - Authentication
+
+Access tokens carry the user's role, approval, group and token version
+as claims, so permission checks and group-scoped queries need no user
+row. The only per-request check is that the token version is still the
+user's current one. That version is cached for AUTH_USER_CACHE_TTL
+seconds and dropped whenever the user is saved or updated in bulk.
+Changing a claimed value bumps the version, so older tokens stop
+working on the next request.
+
+Logging out revokes the access token by recording its jti in the
+RevokedToken table until the token would have expired, and blacklists
+the refresh token. Logging out everywhere bumps the token version and
+blacklists every outstanding refresh token. Both checks share the
+request's single cache lookup. A token's revocation status is read from
+the table on a cache miss and then cached, so revocations survive
+restarts and reach every process. A "not revoked" answer is only cached
+for AUTH_USER_CACHE_TTL seconds, which bounds how long another process
+can keep accepting a revoked token. Tokens issued before they carried a
+token version are rejected, as logging out everywhere cannot reach them.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken, User
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def revoked_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def invalidate_users(user_ids):
+    """Forget cached token versions once the current transaction commits"""
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
+    """One-time tokens for activation links, not valid as password reset tokens"""
+    key_salt = 'api.authentication.AccountActivationTokenGenerator'
+
+
+activation_token_generator = AccountActivationTokenGenerator()
+
+
+def add_claims(token, user):
+    token['role'] = user.role
+    token['is_approved'] = user.is_approved
+    token['group_id'] = user.group_id
+    token['token_version'] = user.token_version
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user's claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        return add_claims(super().for_user(user), user)
+
+
+def revoke(token):
+    """Reject an access token from now until it expires"""
+    remaining = token['exp'] - int(timezone.now().timestamp())
+    if remaining > 0:
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        RevokedToken.objects.bulk_create([
+            RevokedToken(jti=jti, expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc))
+        ], ignore_conflicts=True)
+        cache.set(revoked_key(jti), True, timeout=remaining)
+
+
+def revoke_all(user):
+    """Log a user out of every device"""
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    invalidate_users([user.pk])
+    BlacklistedToken.objects.bulk_create([
+        BlacklistedToken(token=token)
+        for token in OutstandingToken.objects.filter(user_id=user.pk, blacklistedtoken__isnull=True)
+    ], ignore_conflicts=True)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if 'token_version' not in validated_token:
+            # Issued before tokens carried claims
+            raise InvalidToken('Token is out of date, please log in again')
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        version_key = user_cache_key(user_id)
+        revocation_key = revoked_key(jti)
+        cached = cache.get_many([version_key, revocation_key])
+
+        revoked = cached.get(revocation_key)
+        if revoked is None:
+            revoked = RevokedToken.objects.filter(jti=jti).exists()
+            # Another process may revoke the token later, so trust "no" only briefly
+            timeout = validated_token['exp'] - int(timezone.now().timestamp()) if revoked else settings.AUTH_USER_CACHE_TTL
+            cache.set(revocation_key, revoked, timeout=max(timeout, 1))
+        if revoked:
+            raise InvalidToken('Token has been revoked')
+
+        version = cached.get(version_key)
+        if version is None:
+            version = User.objects.filter(pk=user_id, is_active=True).values_list('token_version', flat=True).first()
+            if version is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            cache.set(version_key, version, timeout=settings.AUTH_USER_CACHE_TTL)
+
+        if validated_token['token_version'] != version:
+            raise InvalidToken('Token is out of date, please log in again')
+
+        return User.from_claims(
+            user_id,
+            validated_token['token_version'],
+            validated_token['role'],
+            validated_token['is_approved'],
+            validated_token['group_id']
+        )
@@ -0,0 +1,70 @@
+"""
+Campus Connect - Catalog cache
+
+Read-mostly endpoints cache their responses under keys that include a
+version for every model the response is built from. Saving or deleting
+a row of such a model bumps that model's version once the transaction
+commits, so entries built from the old data are never read again and
+simply expire after CATALOG_CACHE_TTL. Rows that belong to one user,
+such as grades, can instead be versioned per owner.
+
+The same versions, or an aggregate of the rows behind a response, give
+the ETags used to answer conditional GETs without serializing anything.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def is_shared(alias='default'):
+    """Whether other processes see what this one writes to the cache"""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def version_key(model, owner_id=None):
+    key = f'version:{model._meta.label_lower}'
+    return key if owner_id is None else f'{key}:{owner_id}'
+
+
+def get_versions(models, owner_id=None):
+    keys = [version_key(model, owner_id) for model in models]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump(*models, owners=None):
+    """
+    Invalidate everything cached from these models once the current
+    transaction commits, or only what was cached for `owners`
+    """
+    if owners is None:
+        keys = [version_key(model) for model in models]
+    else:
+        keys = [version_key(model, owner_id) for model in models for owner_id in owners]
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, timeout=None))
+
+
+def response_key(view, request, models):
+    # Responses may differ by role and group, and pagination links carry the host
+    user = request.user
+    scope = f'{request.build_absolute_uri()}|{user.role}|{user.group_id}'
+    digest = hashlib.md5(scope.encode()).hexdigest()
+    versions = '.'.join(str(version) for version in get_versions(models))
+    return f'response:{type(view).__name__}:{versions}:{digest}'
+
+
+def etag(request, *parts):
+    """Strong ETag for what this user gets from this URL given `parts`"""
+    user = request.user
+    scope = [request.build_absolute_uri(), request.accepted_media_type, user.pk, user.role, user.group_id, *parts]
+    return '"%s"' % hashlib.md5('|'.join(str(part) for part in scope).encode()).hexdigest()
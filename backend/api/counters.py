@@ -0,0 +1,58 @@
+"""
+Campus Connect - Unread counters
+
+Per-user unread counts kept in the cache so badge refreshes cost a single
+lookup. Creating a row increments the counter and marking one read
+decrements it. Entries expire after UNREAD_COUNT_TTL seconds and are then
+recounted from the tables, which corrects any drift.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Message, Notification
+
+
+COUNTED = {
+    'notifications': lambda user_id: Notification.objects.filter(user_id=user_id, is_read=False),
+    'messages': lambda user_id: Message.objects.filter(receiver_id=user_id, is_read=False),
+}
+
+
+def counter_key(kind, user_id):
+    return f'unread:{kind}:{user_id}'
+
+
+def get_unread_counts(user_id):
+    keys = {kind: counter_key(kind, user_id) for kind in COUNTED}
+    cached = cache.get_many(keys.values())
+
+    counts = {}
+    recounted = {}
+    for kind, key in keys.items():
+        if key in cached:
+            counts[kind] = max(cached[key], 0)
+        else:
+            counts[kind] = recounted[key] = COUNTED[kind](user_id).count()
+
+    if recounted:
+        cache.set_many(recounted, timeout=settings.UNREAD_COUNT_TTL)
+    return counts
+
+
+def adjust(kind, user_id, delta):
+    """Shift a counter once the current transaction commits"""
+    def apply():
+        try:
+            cache.incr(counter_key(kind, user_id), delta)
+        except ValueError:
+            # Not cached: the next read recounts from the table
+            pass
+    transaction.on_commit(apply)
+
+
+def invalidate(kind, user_ids):
+    """Drop counters that can no longer be adjusted exactly"""
+    keys = [counter_key(kind, user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
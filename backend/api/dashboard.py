@@ -0,0 +1,86 @@
+"""
+Campus Connect - Student dashboard
+
+Everything the student home screen shows in one response: the group's
+courses with their teacher, the student's average and attendance rate
+in each, the active timetable and the unread counts. Building it takes
+four queries whatever the number of courses. The result is cached per
+student under the versions of the catalog models and of the student's
+own grades and attendance (see api/caching.py), so repeat loads cost no
+query. Unread counts come from their own counters on every request.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import caching, counters
+from .models import Attendance, Course, CourseAssignment, Grade, Group, Timetable, User
+from .serializers import DashboardCourseSerializer, TimetableSerializer
+
+
+CATALOG_MODELS = (CourseAssignment, Course, Group, User, Timetable)
+STUDENT_MODELS = (Grade, Attendance)
+
+
+def attendance_summary(student_id):
+    """Sessions attended and absences per course; excused sessions do not count"""
+    rows = Attendance.objects.filter(student_id=student_id).values('course_id').annotate(
+        counted=Count('pk', filter=~Q(status=Attendance.EXCUSED)),
+        attended=Count('pk', filter=Q(status__in=(Attendance.PRESENT, Attendance.LATE))),
+        absences=Count('pk', filter=Q(status=Attendance.ABSENT))
+    ).order_by()
+    return {row['course_id']: row for row in rows}
+
+
+def build(student):
+    if not student.group_id:
+        return {'courses': [], 'timetable': None}
+
+    assignments = CourseAssignment.objects.filter(group_id=student.group_id).values(
+        'pk', 'course_id', 'course__code', 'course__name', 'course__credits',
+        'teacher__first_name', 'teacher__last_name'
+    ).order_by('course__code', 'pk')
+    averages = dict(Grade.objects.filter(student_id=student.pk).values_list('course_id', 'average').order_by())
+    attendance = attendance_summary(student.pk)
+
+    courses = []
+    for assignment in assignments:
+        summary = attendance.get(assignment['course_id'], {})
+        counted = summary.get('counted')
+        courses.append({
+            'assignment_id': assignment['pk'],
+            'course_id': assignment['course_id'],
+            'course_code': assignment['course__code'],
+            'course_name': assignment['course__name'],
+            'credits': assignment['course__credits'],
+            'teacher_name': f"{assignment['teacher__first_name']} {assignment['teacher__last_name']}".strip(),
+            'average': averages.get(assignment['course_id']),
+            'attendance_rate': round(Decimal(100 * summary['attended']) / counted, 2) if counted else None,
+            'absences': summary.get('absences', 0),
+        })
+
+    timetable = Timetable.objects.select_related('group').filter(
+        group_id=student.group_id,
+        is_active=True
+    ).first()
+
+    return {
+        'courses': DashboardCourseSerializer(courses, many=True).data,
+        'timetable': TimetableSerializer(timetable).data if timetable else None,
+    }
+
+
+def get(student):
+    versions = [
+        *caching.get_versions(CATALOG_MODELS),
+        *caching.get_versions(STUDENT_MODELS, owner_id=student.pk),
+    ]
+    key = f"dashboard:{student.pk}:{student.group_id}:{'.'.join(str(version) for version in versions)}"
+    data = cache.get(key)
+    if data is None:
+        data = build(student)
+        cache.set(key, data, timeout=settings.DASHBOARD_CACHE_TTL)
+    return {**data, 'unread': counters.get_unread_counts(student.pk)}
@@ -0,0 +1,71 @@
+from functools import reduce
+from operator import add, or_
+
+import django_filters
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from rest_framework import filters
+
+from .models import Grade
+
+
+class GradeFilter(django_filters.FilterSet):
+    """
+    Filter grades on the stored average, e.g. ?average_below=10
+    """
+    
+    average_min = django_filters.NumberFilter(field_name='average', lookup_expr='gte')
+    average_below = django_filters.NumberFilter(field_name='average', lookup_expr='lt')
+    graded = django_filters.BooleanFilter(field_name='average', lookup_expr='isnull', exclude=True)
+    
+    class Meta:
+        model = Grade
+        fields = []
+
+
+class NullsLastOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that keeps rows without a value at the end, so
+    ?ordering=-average ranks students before the ungraded ones.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        
+        return queryset.order_by(*[
+            F(field[1:]).desc(nulls_last=True) if field.startswith('-') else F(field).asc(nulls_last=True)
+            for field in ordering
+        ])
+
+
+class TrigramSearchFilter(filters.SearchFilter):
+    """
+    Ranked fuzzy search over the view's search_fields
+    
+    On PostgreSQL each ?search= term matches on pg_trgm word similarity,
+    which the trigram index on the user columns can answer, so prefixes
+    and small typos both match. Results come back best match first
+    unless the request asks for another ordering. Other databases fall
+    back to the plain SearchFilter.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms or connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        
+        # Like SearchFilter, every term has to match one of the fields
+        queryset = queryset.filter(*[
+            reduce(or_, [Q(**{f'{field}__trigram_word_similar': term}) for field in search_fields])
+            for term in search_terms
+        ])
+        rank = reduce(add, [
+            Greatest(*[TrigramWordSimilarity(term, field) for field in search_fields], Value(0.0))
+            for term in search_terms
+        ])
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', 'pk')
@@ -0,0 +1,68 @@
+"""
+Campus Connect - Grade publication notifications
+
+Saving marks does not notify students straight away. The grade row is
+flagged as pending, and once the save commits one task is queued for the
+end of the current GRADE_NOTIFICATION_WINDOW, keyed by that window, so a
+teacher re-entering a whole sheet queues a single task. When it runs,
+every pending row gets one GRADE notification, written in batches, and
+its flag is cleared. Rows are picked by the flag rather than by when
+they were saved, so a save that commits after its window's task ran is
+sent by the task its own commit queued.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import realtime, tasks
+from .models import Grade, Notification
+
+
+def window_end(moment):
+    window = settings.GRADE_NOTIFICATION_WINDOW
+    return datetime.fromtimestamp((int(moment.timestamp()) // window + 1) * window, tz=dt_timezone.utc)
+
+
+def enqueue():
+    now = timezone.now()
+    end = window_end(now)
+    tasks.enqueue(
+        'publish_grade_notifications',
+        {'window_end': end.isoformat()},
+        key=f'grade-notifications:{end.isoformat()}',
+        delay=(end - now).total_seconds()
+    )
+
+
+def schedule():
+    """
+    Make sure pending rows get their notifications
+
+    The window is taken at commit time: the task of that window has not
+    run yet, so it will see the rows being committed.
+    """
+    transaction.on_commit(enqueue)
+
+
+def publish():
+    with transaction.atomic():
+        # Locked so a concurrent save waits, then flags its row again
+        pending = list(Grade.objects.select_for_update(of=('self',)).filter(
+            notification_pending=True
+        ).values_list('pk', 'student_id', 'course__code', 'course__name').order_by('pk'))
+
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=student_id,
+                title=f"New grade in {code}",
+                message=f"Your marks for {name} have been updated.",
+                notification_type='GRADE'
+            )
+            for _, student_id, code, name in pending
+        ], batch_size=settings.GRADE_NOTIFICATION_BATCH_SIZE)
+        Grade.objects.filter(pk__in=[pk for pk, *_ in pending]).update(notification_pending=False)
+        realtime.publish_notifications(notifications)
+    return len(notifications)
@@ -0,0 +1,62 @@
+"""
+Campus Connect - Background jobs
+
+Handlers for the task queue in api/tasks.py.
+"""
+
+from django.utils import timezone
+
+from . import announcements, grade_notifications, provisioning
+from .models import Announcement, Message, Notification, User, UserImport
+from .tasks import task
+
+
+@task('notify_message')
+def notify_message(message_id):
+    message = Message.objects.select_related('sender').filter(pk=message_id).first()
+    if message is None:
+        return
+    
+    sender_display_name = message.sender.get_full_name().strip() or message.sender.username
+    Notification.objects.create(
+        user_id=message.receiver_id,
+        title=f"New Message from {sender_display_name}",
+        message=message.content[:100] + ("..." if len(message.content) > 100 else ""),
+        notification_type='MESSAGE'
+    )
+
+
+@task('notify_registration')
+def notify_registration(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    
+    if user.is_approved:
+        title, message = 'Registration approved', 'Your account has been approved. Welcome to Campus Connect!'
+    else:
+        title, message = 'Registration rejected', f'Your registration was rejected: {user.rejection_reason}'
+    Notification.objects.create(user=user, title=title, message=message, notification_type='REG')
+
+
+@task('deliver_announcement', max_attempts=5)
+def deliver_announcement(announcement_id):
+    try:
+        announcements.deliver(announcement_id)
+    except Exception:
+        Announcement.objects.filter(pk=announcement_id).update(status=Announcement.FAILED, finished_at=timezone.now())
+        raise
+
+
+@task('publish_grade_notifications')
+def publish_grade_notifications(window_end=None):
+    grade_notifications.publish()
+
+
+@task('import_users')
+def import_users(import_id):
+    try:
+        provisioning.run_import(import_id)
+    except Exception:
+        UserImport.objects.filter(pk=import_id).update(status=UserImport.FAILED, finished_at=timezone.now())
+        raise
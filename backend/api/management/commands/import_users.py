@@ -0,0 +1,43 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import provisioning
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create student or teacher accounts from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with username, email, first_name, last_name, student_id, program, semester, group, password')
+        parser.add_argument('--role', choices=[User.STUDENT, User.TEACHER], default=User.STUDENT)
+        parser.add_argument('--activation', action='store_true', help='Issue activation links instead of hashing passwords')
+        parser.add_argument('--workers', type=int, help='Processes used to hash passwords')
+        parser.add_argument('--report', help='Write the per-row results to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as f:
+                rows = provisioning.read_csv(f.read())
+        except OSError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(f'Importing {len(rows)} row(s)...')
+        results = provisioning.import_users(
+            rows,
+            role=options['role'],
+            activation=options['activation'],
+            workers=options['workers'] or settings.USER_IMPORT_WORKERS
+        )
+
+        for result in results:
+            if result['status'] == 'error':
+                self.stderr.write(f"Row {result['row']}: {json.dumps(result['errors'])}")
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        created = sum(result['status'] == 'created' for result in results)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} user(s), {len(results) - created} row(s) failed'))
@@ -2,6 +2,7 @@ import random
 from datetime import date, timedelta
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from api.models import Course, Group, CourseAssignment, Grade, Attendance, CourseFile, Timetable, Message, Notification
 
 User = get_user_model()
@@ -59,11 +60,14 @@ class Command(BaseCommand):
 
         # 4. Create Teachers
         teachers = []
+        # Every sample account shares its role's password, so hash it once
+        teacher_password = make_password('teacher123')
         teacher_names = [('teacher1', 'John', 'Doe'), ('teacher2', 'Jane', 'Smith')]
         for username, first, last in teacher_names:
             teacher, created = User.objects.get_or_create(
                 username=username,
                 defaults={
+                    'password': teacher_password,
                     'first_name': first,
                     'last_name': last,
                     'email': f'{username}@campusconnect.com',
@@ -72,8 +76,6 @@ class Command(BaseCommand):
                 }
             )
             if created:
-                teacher.set_password('teacher123')
-                teacher.save()
                 self.stdout.write(f'Created teacher user: {username}')
             teachers.append(teacher)
 
@@ -86,11 +88,13 @@ class Command(BaseCommand):
             ('student5', 'Eve', 'Foster', 'IFA G3', True),
         ]
         students = []
+        student_password = make_password('student123')
         for username, first, last, group_name, approved in student_data:
             group = Group.objects.get(name=group_name)
             student, created = User.objects.get_or_create(
                 username=username,
                 defaults={
+                    'password': student_password,
                     'first_name': first,
                     'last_name': last,
                     'email': f'{username}@campusconnect.com',
@@ -102,8 +106,6 @@ class Command(BaseCommand):
                 }
             )
             if created:
-                student.set_password('student123')
-                student.save()
                 self.stdout.write(f'Created student user: {username}')
             students.append(student)
 
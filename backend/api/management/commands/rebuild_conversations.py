@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from api.models import Message, Conversation
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the conversation summaries from the message history'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding conversations...')
+
+        # One aggregate row per direction of every thread
+        directions = Message.objects.values('sender', 'receiver').annotate(
+            last_id=Max('id'),
+            unread=Count('id', filter=Q(is_read=False))
+        )
+
+        threads = {}
+        for row in directions:
+            for owner, peer, unread in [(row['sender'], row['receiver'], 0), (row['receiver'], row['sender'], row['unread'])]:
+                thread = threads.setdefault((owner, peer), {'last_id': 0, 'unread': 0})
+                thread['last_id'] = max(thread['last_id'], row['last_id'])
+                thread['unread'] += unread
+
+        timestamps = dict(Message.objects.filter(
+            id__in={thread['last_id'] for thread in threads.values()}
+        ).values_list('id', 'timestamp'))
+
+        with transaction.atomic():
+            Conversation.objects.all().delete()
+            Conversation.objects.bulk_create([
+                Conversation(
+                    owner_id=owner,
+                    peer_id=peer,
+                    last_message_id=thread['last_id'],
+                    last_message_at=timestamps[thread['last_id']],
+                    unread_count=thread['unread']
+                )
+                for (owner, peer), thread in threads.items()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(threads)} conversations'))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import caching, tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due, then exit')
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not caching.is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process: unread counters changed by tasks are only '
+                'recounted by the web server after UNREAD_COUNT_TTL. Set CACHE_URL to share it.'
+            ))
+        
+        self.stdout.write('Running tasks...')
+
+        while True:
+            claimed = tasks.run_pending(options['batch_size'])
+            if claimed:
+                self.stdout.write(f'Ran {claimed} task(s)')
+            elif options['once']:
+                break
+            else:
+                time.sleep(settings.TASK_POLL_INTERVAL)
@@ -1,3 +1,4 @@
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from api.models import User, Course, Group, CourseAssignment, Grade, Attendance, Timetable, Notification
@@ -59,10 +60,13 @@ class Command(BaseCommand):
         # 4. Create Teachers
         self.stdout.write('Creating Teachers...')
         teachers = []
+        # Every seeded account shares its role's password, so hash it once
+        teacher_password = make_password('teacher123')
         for i in range(1, 6):
             t, created = User.objects.get_or_create(
                 username=f'teacher{i}',
                 defaults={
+                    'password': teacher_password,
                     'email': f'teacher{i}@campus.com',
                     'role': User.TEACHER,
                     'is_approved': True,
@@ -70,9 +74,6 @@ class Command(BaseCommand):
                     'last_name': f'{i}'
                 }
             )
-            if created:
-                t.set_password('teacher123')
-                t.save()
             teachers.append(t)
 
         # 5. Assign Teachers to Courses/Groups
@@ -89,11 +90,13 @@ class Command(BaseCommand):
         # 6. Create Students
         self.stdout.write('Creating Students...')
         students = []
+        student_password = make_password('student123')
         for i in range(1, 21): # 20 students
             group = random.choice(groups)
             s, created = User.objects.get_or_create(
                 username=f'student{i}',
                 defaults={
+                    'password': student_password,
                     'email': f'student{i}@campus.com',
                     'role': User.STUDENT,
                     'student_id': f'202500{i}',
@@ -105,9 +108,6 @@ class Command(BaseCommand):
                     'semester': 1
                 }
             )
-            if created:
-                s.set_password('student123')
-                s.save()
             students.append(s)
 
         # 7. Create Grades & Attendance (Randomized)
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import caching
+
+
+class EagerLoadingViewMixin:
+    """
+    Builds the view's queryset with the relations its serializer reads.
+
+    Hooked into filter_queryset so it applies to list and detail lookups
+    alike, whatever the view's own get_queryset returns.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+
+class CachedListMixin:
+    """
+    Serves list responses from the cache.
+
+    Entries are keyed by the request URL, the user's role and group and
+    the versions of the view's `cache_models`, so any write to one of
+    those models retires them (see api/caching.py).
+    """
+
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        key = caching.response_key(self, request, self.cache_models)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, timeout=settings.CATALOG_CACHE_TTL)
+        return response
+
+
+
+class ConditionalGetMixin:
+    """
+    Answers GETs whose If-None-Match still matches with an empty 304.
+
+    The ETag comes from the versions of `etag_models` and, when
+    `etag_updated_field` is set, from the count and latest value of that
+    field over the rows the request would return, so checking it costs
+    at most one aggregate query and never serializes the response.
+    """
+
+    etag_models = ()
+    etag_updated_field = None
+
+    def get_etag_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_etag(self, request):
+        parts = caching.get_versions(self.etag_models)
+        if self.etag_updated_field:
+            summary = self.get_etag_queryset().aggregate(latest=Max(self.etag_updated_field), count=Count('pk'))
+            parts += [summary['latest'], summary['count']]
+        return caching.etag(request, *parts)
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        tags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in (tag.removeprefix('W/') for tag in tags):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
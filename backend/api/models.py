@@ -1,4 +1,11 @@
-from django.db import models
+from functools import reduce
+from operator import add
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, router
+from django.db.models.base import DEFERRED
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -31,11 +38,87 @@ class User(AbstractUser):
     
     group = models.ForeignKey('Group', on_delete=models.SET_NULL, null=True, blank=True, related_name='students')
     
+    # Bumped whenever a value carried in the access token claims changes,
+    # which invalidates tokens issued before the change
+    token_version = models.PositiveIntegerField(default=0)
+    
+    # Who shows up in user search: active accounts, except students still awaiting approval
+    is_searchable = models.GeneratedField(
+        expression=ExpressionWrapper(
+            Q(is_active=True) & (~Q(role=STUDENT) | Q(is_approved=True) | Q(is_staff=True) | Q(is_superuser=True)),
+            output_field=models.BooleanField()
+        ),
+        output_field=models.BooleanField(),
+        db_persist=True
+    )
+    
     class Meta:
         ordering = ['username']
+        indexes = [
+            models.Index(fields=['role', 'is_approved'], name='user_role_approved_idx'),
+            models.Index(fields=['username'], condition=Q(role='STUDENT', is_approved=False), name='user_pending_students_idx'),
+            models.Index(fields=['username'], condition=Q(is_searchable=True), name='user_searchable_idx'),
+            # Trigram index behind TrigramSearchFilter; needs the pg_trgm extension
+            GinIndex(
+                fields=['first_name', 'last_name', 'username', 'email', 'student_id'],
+                opclasses=['gin_trgm_ops'] * 5,
+                name='user_search_trgm_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
+    
+    # Fields carried in access tokens, see api/authentication.py
+    CLAIM_FIELDS = ('role', 'is_approved', 'group_id', 'is_active')
+    # Fields whose changes save() reports in `changed_fields`
+    TRACKED_FIELDS = CLAIM_FIELDS + ('first_name', 'last_name', 'student_id')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.TRACKED_FIELDS and value is not DEFERRED
+        }
+        return instance
+    
+    @classmethod
+    def from_claims(cls, user_id, token_version, role, is_approved, group_id):
+        """
+        A user built from token claims without a query. Any other field
+        is loaded from the database, all at once, on first access.
+        """
+        claims = {
+            'id': cls._meta.pk.to_python(user_id),
+            'role': role,
+            'is_approved': is_approved,
+            'group_id': group_id,
+            'is_active': True,
+            'token_version': token_version,
+        }
+        # from_db expects the values in field order, with DEFERRED for the rest
+        values = [claims.get(field.attname, DEFERRED) for field in cls._meta.concrete_fields]
+        user = cls.from_db(router.db_for_read(cls), [field.attname for field in cls._meta.concrete_fields], values)
+        user._claims_only = True
+        return user
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if fields is not None and getattr(self, '_claims_only', False):
+            self._claims_only = False
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+    
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', {})
+        self.changed_fields = {name for name, value in loaded.items() if getattr(self, name) != value}
+        if self.changed_fields.intersection(self.CLAIM_FIELDS):
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'token_version'}
+        super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS if name not in deferred}
 
 
 
@@ -83,7 +166,31 @@ class CourseAssignment(models.Model):
 
 
 
+class GradeManager(models.Manager):
+
+    def materialize(self, course_id, group_id):
+        """Create the missing grade rows of a group for a course in one pass"""
+        missing = User.objects.filter(
+            role=User.STUDENT,
+            group_id=group_id
+        ).exclude(grades__course_id=course_id).values_list('pk', flat=True)
+        
+        return self.bulk_create(
+            [self.model(student_id=pk, course_id=course_id) for pk in missing],
+            ignore_conflicts=True
+        )
+
+
+def mark_average(fields):
+    """Mean of the marks entered so far, NULL until one is entered"""
+    total = reduce(add, [Coalesce(F(name), Value(0), output_field=DecimalField()) for name in fields])
+    entered = reduce(add, [Case(When(**{f'{name}__isnull': False}, then=1), default=0) for name in fields])
+    return ExpressionWrapper(total / NullIf(entered, 0), output_field=DecimalField(max_digits=5, decimal_places=2))
+
+
 class Grade(models.Model):
+    MARK_FIELDS = ('td_mark', 'tp_mark', 'exam_mark')
+    
     student = models.ForeignKey(
         User, 
         on_delete=models.CASCADE,
@@ -114,22 +221,44 @@ class Grade(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(20)]
     )
     
+    # Stored by the database so rankings and reports can filter and sort on it
+    average = models.GeneratedField(
+        expression=mark_average(MARK_FIELDS),
+        output_field=models.DecimalField(max_digits=5, decimal_places=2, null=True),
+        db_persist=True
+    )
+    
     comments = models.TextField(blank=True)
     
+    # Marks saved since the student was last notified, see api/grade_notifications.py
+    notification_pending = models.BooleanField(default=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = GradeManager()
+    
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['course', 'student'], name='grade_course_student_idx'),
+            models.Index(fields=['course', 'average'], name='grade_course_average_idx'),
+            models.Index(fields=['id'], condition=Q(notification_pending=True), name='grade_notification_pending_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.course.code}"
     
-    @property
-    def average(self):
-        marks = [m for m in [self.td_mark, self.tp_mark, self.exam_mark] if m is not None]
-        return sum(marks) / len(marks) if marks else None
+    def save(self, *args, **kwargs):
+        if self.has_marks():
+            self.notification_pending = True
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'notification_pending'}
+        super().save(*args, **kwargs)
+    
+    def has_marks(self):
+        return any(getattr(self, field) is not None for field in self.MARK_FIELDS)
 
 
 
@@ -164,6 +293,9 @@ class Attendance(models.Model):
     class Meta:
         unique_together = ['student', 'course', 'week_number']
         ordering = ['week_number']
+        indexes = [
+            models.Index(fields=['course', 'week_number'], name='attendance_course_week_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.course.code} - {self.date}"
@@ -214,6 +346,9 @@ class Timetable(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['group', '-created_at'], condition=Q(is_active=True), name='timetable_active_idx'),
+        ]
     
     def __str__(self):
         return f"{self.group.name} - {self.title}"
@@ -229,12 +364,61 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='message_thread_idx'),
+            models.Index(fields=['receiver'], condition=Q(is_read=False), name='message_unread_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender.username} to {self.receiver.username}"
 
 
 
+class ConversationManager(models.Manager):
+
+    def record(self, message):
+        """Move both sides of the thread onto a newly sent message"""
+        sides = [
+            (message.sender_id, message.receiver_id, 0),
+            (message.receiver_id, message.sender_id, 1),
+        ]
+        self.bulk_create(
+            [self.model(owner_id=owner, peer_id=peer, last_message_at=message.timestamp) for owner, peer, _ in sides],
+            ignore_conflicts=True
+        )
+        for owner, peer, unread in sides:
+            self.filter(owner_id=owner, peer_id=peer).update(
+                last_message=message,
+                last_message_at=message.timestamp,
+                unread_count=F('unread_count') + unread
+            )
+
+
+class Conversation(models.Model):
+    """
+    One row per user and peer, kept up to date as messages are sent so
+    the inbox never has to scan the message history.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    objects = ConversationManager()
+
+    class Meta:
+        unique_together = ['owner', 'peer']
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['owner', '-last_message_at'], name='conversation_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} with {self.peer.username}"
+
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('MESSAGE', 'New Message Received'),
@@ -253,11 +437,85 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_user_recent_idx'),
+            models.Index(fields=['user', '-created_at'], condition=Q(is_read=False), name='notification_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.notification_type}: {self.title} for {self.user.username}"
 
 
+class Announcement(models.Model):
+    """
+    A notification sent to every member of a group, a course, a role or
+    the whole school. The per-user rows are written in the background and
+    `sent` tracks the progress.
+    """
+    GROUP = 'GROUP'
+    COURSE = 'COURSE'
+    ROLE = 'ROLE'
+    ALL = 'ALL'
+
+    TARGET_CHOICES = [
+        (GROUP, 'Group'),
+        (COURSE, 'Course'),
+        (ROLE, 'Role'),
+        (ALL, 'Whole school'),
+    ]
+
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='announcements')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=10, choices=Notification.NOTIFICATION_TYPES, default='INFO')
+
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    target_id = models.IntegerField(null=True, blank=True)
+    target_role = models.CharField(max_length=10, choices=User.ROLE_CHOICES, null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.title} ({self.target})"
+
+    def recipients(self):
+        users = User.objects.filter(is_active=True)
+        if self.target == self.GROUP:
+            return users.filter(group_id=self.target_id)
+        if self.target == self.COURSE:
+            users = users.filter(role=User.STUDENT, group__courses=self.target_id)
+            if self.created_by.role == User.TEACHER:
+                # Only the groups the teacher takes for this course
+                users = users.filter(group__in=CourseAssignment.objects.filter(
+                    teacher_id=self.created_by_id,
+                    course_id=self.target_id
+                ).values('group_id'))
+            return users
+        if self.target == self.ROLE:
+            return users.filter(role=self.target_role)
+        return users
+
+
 class ScheduleSession(models.Model):
     assignment = models.ForeignKey(CourseAssignment, on_delete=models.CASCADE, related_name='sessions')
     
@@ -285,6 +543,103 @@ class ScheduleSession(models.Model):
     
     class Meta:
         ordering = ['day', 'start_time']
+        indexes = [
+            models.Index(fields=['assignment', 'day', 'start_time'], name='session_assignment_day_idx'),
+        ]
 
     def __str__(self):
         return f"{self.assignment.course.code} - {self.day} {self.start_time}"
+
+
+
+class Task(models.Model):
+    """
+    A unit of background work, run by the `run_tasks` worker command
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['run_after'], condition=Q(status='PENDING'), name='task_due_idx'),
+            models.Index(fields=['updated_at'], condition=Q(status='DONE'), name='task_done_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+
+
+class RevokedToken(models.Model):
+    """
+    An access token rejected until it expires, see api/authentication.py
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class UserImport(models.Model):
+    """
+    Accounts to create from an uploaded CSV, imported in the background,
+    see api/provisioning.py. The rows may hold passwords, so they are
+    dropped once the import is done; `results` reports every row.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_imports')
+    role = models.CharField(max_length=10, choices=User.ROLE_CHOICES, default=User.STUDENT)
+    activation = models.BooleanField(default=False)
+    rows = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import of {self.total} {self.role.lower()} row(s) ({self.status})"
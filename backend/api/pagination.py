@@ -0,0 +1,110 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over a (timestamp, id) pair declared by the view
+
+    The view sets `keyset_ordering`, e.g. ('timestamp', 'id') or
+    ('-created_at', '-id'); the sign of the first field is the order rows
+    are returned in. Without a cursor the newest page is returned.
+    `?before=<cursor>` walks back through history and `?after=<cursor>`
+    returns only rows created since, so clients can poll for the delta.
+    Pages never use OFFSET and do not shift when new rows arrive.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    before_query_param = 'before'
+    after_query_param = 'after'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = view.keyset_ordering
+        self.field = ordering[0].lstrip('-')
+        self.newest_first = ordering[0].startswith('-')
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+
+        after = self.decode_cursor(request.query_params.get(self.after_query_param))
+        before = self.decode_cursor(request.query_params.get(self.before_query_param))
+
+        if after:
+            queryset = queryset.filter(self.beyond(after, 'gt')).order_by(self.field, 'pk')
+        else:
+            if before:
+                queryset = queryset.filter(self.beyond(before, 'lt'))
+            queryset = queryset.order_by(f'-{self.field}', '-pk')
+
+        rows = list(queryset[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+
+        # Rows were fetched walking away from the cursor; flip them into display order
+        ascending = bool(after)
+        if ascending == self.newest_first:
+            rows.reverse()
+
+        if rows:
+            positions = sorted(rows, key=lambda row: (getattr(row, self.field), row.pk))
+            self.newer = self.encode_cursor(positions[-1])
+            self.older = self.encode_cursor(positions[0]) if more or after else None
+        else:
+            self.newer = request.query_params.get(self.after_query_param)
+            self.older = None
+        return rows
+
+    def beyond(self, cursor, lookup):
+        value, pk = cursor
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row):
+        raw = f'{getattr(row, self.field).isoformat()}|{row.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(value), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, param, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.base_url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'newer': self.get_link(self.after_query_param, self.newer),
+            'older': self.get_link(self.before_query_param, self.older),
+            'results': data,
+        })
+
+
+class SearchResultsPagination(PageNumberPagination):
+    """Small pages for type-ahead search boxes"""
+    
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 25
@@ -0,0 +1,202 @@
+"""
+Campus Connect - Bulk account provisioning
+
+Creates accounts from CSV rows for `python manage.py import_users` and
+the admin import endpoint. Both hash passwords across a process pool:
+the endpoint stores the rows as a UserImport and the `run_tasks` worker
+imports them in USER_IMPORT_BATCH_SIZE chunks, recording progress after
+each, as a web process must neither fork nor hash for minutes. Without
+a worker (TASKS_EAGER) the endpoint only takes activation imports.
+
+Rows are inserted with bulk_create in USER_IMPORT_BATCH_SIZE batches,
+and a batch that hits a conflict, such as a username taken by a
+concurrent request, is retried row by row so the others are still
+created. With activation links no password is hashed up front:
+accounts get an unusable password and a one-time link instead, and the
+hash is computed when the user picks a password on activation.
+"""
+
+import csv
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import caching
+from .authentication import activation_token_generator
+from .models import Group, User, UserImport
+from .serializers import UserImportRecordSerializer
+
+
+def read_csv(data):
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    return [
+        {key.strip(): value.strip() for key, value in row.items() if key and value not in (None, '')}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def setup_worker():
+    # Spawned workers start without Django; forked ones already have it
+    django.setup()
+
+
+def hash_passwords(passwords, workers=1):
+    if workers <= 1 or len(passwords) < 2 * workers:
+        return [make_password(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def activation_link(user):
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = activation_token_generator.make_token(user)
+    return settings.ACCOUNT_ACTIVATION_URL.format(uid=uid, token=token)
+
+
+def insert(users):
+    """Insert a batch, returning the users that could not be created"""
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+        return []
+    except IntegrityError:
+        pass
+    
+    failed = []
+    for user in users:
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user])
+        except IntegrityError:
+            failed.append(user)
+    return failed
+
+
+def import_users(rows, role=User.STUDENT, activation=False, workers=1, first_row=1):
+    """
+    Create one account per row, returning a result per row in input order
+
+    Rows that fail validation, clash with an existing account or another
+    row, or name an unknown group are reported and skipped; the others
+    are still created. Rows are numbered from `first_row`.
+    """
+    results = {}
+    valid = []
+    for number, row in enumerate(rows, start=first_row):
+        serializer = UserImportRecordSerializer(data=row, context={'activation': activation})
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            results[number] = {'row': number, 'status': 'error', 'errors': serializer.errors}
+
+    usernames = {data['username'] for _, data in valid}
+    student_ids = {data['student_id'] for _, data in valid if data.get('student_id')}
+    taken = {
+        'username': set(User.objects.filter(username__in=usernames).values_list('username', flat=True)),
+        'student_id': set(User.objects.filter(student_id__in=student_ids).values_list('student_id', flat=True)),
+    }
+    groups = dict(Group.objects.filter(
+        name__in={data['group'] for _, data in valid if data.get('group')}
+    ).values_list('name', 'pk'))
+
+    accepted = []
+    for number, data in valid:
+        errors = {}
+        for field in ('username', 'student_id'):
+            value = data.get(field)
+            if value and value in taken[field]:
+                errors[field] = [f'{value} is already taken']
+        if data.get('group') and data['group'] not in groups:
+            errors['group'] = [f'Unknown group {data["group"]}']
+        if errors:
+            results[number] = {'row': number, 'status': 'error', 'errors': errors}
+            continue
+
+        for field in ('username', 'student_id'):
+            if data.get(field):
+                taken[field].add(data[field])
+        accepted.append((number, data))
+
+    if activation:
+        hashes = [make_password(None) for _ in accepted]
+    else:
+        hashes = hash_passwords([data.pop('password') for _, data in accepted], workers)
+
+    users = [
+        User(
+            username=data['username'],
+            email=data.get('email', ''),
+            first_name=data.get('first_name', ''),
+            last_name=data.get('last_name', ''),
+            student_id=data.get('student_id') if role == User.STUDENT else None,
+            program=data.get('program'),
+            semester=data.get('semester', 1),
+            group_id=groups.get(data.get('group')) if role == User.STUDENT else None,
+            password=password,
+            role=role,
+            is_approved=True
+        )
+        for (_, data), password in zip(accepted, hashes)
+    ]
+
+    size = settings.USER_IMPORT_BATCH_SIZE
+    failed = set()
+    for start in range(0, len(users), size):
+        failed.update(id(user) for user in insert(users[start:start + size]))
+    if len(failed) < len(users):
+        # bulk_create skips post_save
+        caching.bump(User)
+
+    for (number, _), user in zip(accepted, users):
+        if id(user) in failed:
+            results[number] = {
+                'row': number,
+                'status': 'error',
+                'errors': {'non_field_errors': ['Conflicts with an account created meanwhile']}
+            }
+            continue
+        result = {'row': number, 'status': 'created', 'id': user.pk, 'username': user.username}
+        if activation:
+            result['activation_url'] = activation_link(user)
+        results[number] = result
+
+    return [results[number] for number in sorted(results)]
+
+
+def run_import(import_id):
+    """Import a UserImport's rows, resuming after the last chunk recorded"""
+    user_import = UserImport.objects.get(pk=import_id)
+    UserImport.objects.filter(pk=import_id).update(status=UserImport.RUNNING)
+
+    # Each chunk commits together with its progress, so a retry resumes cleanly
+    results = user_import.results
+    size = settings.USER_IMPORT_BATCH_SIZE
+    for start in range(user_import.processed, len(user_import.rows), size):
+        with transaction.atomic():
+            chunk = import_users(
+                user_import.rows[start:start + size],
+                role=user_import.role,
+                activation=user_import.activation,
+                workers=settings.USER_IMPORT_WORKERS,
+                first_row=start + 1
+            )
+            results = results + chunk
+            created = sum(result['status'] == 'created' for result in chunk)
+            UserImport.objects.filter(pk=import_id).update(
+                processed=F('processed') + len(chunk),
+                created=F('created') + created,
+                failed=F('failed') + len(chunk) - created,
+                results=results
+            )
+
+    UserImport.objects.filter(pk=import_id).update(status=UserImport.DONE, rows=[], finished_at=timezone.now())
@@ -0,0 +1,173 @@
+"""
+Campus Connect - Real-time push
+
+Events are delivered to the users' open event streams through a broker.
+PostgresBroker, the default, sends every event through PostgreSQL
+LISTEN/NOTIFY, so events published by any process, including the
+`run_tasks` worker, reach the streams open in every web process.
+InProcessBroker only reaches clients connected to the publishing process.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import connection, connections, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import counters
+from .serializers import NotificationSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Called from the loop's own thread; a client too slow to drain
+        # its queue loses the event rather than stalling everyone else.
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+
+class InProcessBroker:
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Must be called from the event loop that will consume the events"""
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Publishes with pg_notify and hands the notifications each process
+    receives to that process's own subscribers. The listening connection
+    is opened by a background thread on the first subscription, so
+    processes that only publish, like the task worker, never listen.
+    """
+
+    channel = 'realtime_events'
+    # NOTIFY payloads must stay under 8000 bytes
+    max_payload = 7900
+
+    def __init__(self):
+        super().__init__()
+        self.listening = threading.Event()
+        self._listener = None
+        self._connection = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, name='realtime-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        payload = json.dumps({'user_id': user_id, 'event': event}, cls=DjangoJSONEncoder)
+        if len(payload.encode()) > self.max_payload:
+            # Too large to send whole; the client fetches the row itself
+            event = {'type': event['type'], 'data': {'id': event['data'].get('id')}, 'partial': True}
+            payload = json.dumps({'user_id': user_id, 'event': event}, cls=DjangoJSONEncoder)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def stop(self):
+        self._stopped.set()
+        if self._connection is not None:
+            self._connection.close()
+        if self._listener is not None:
+            self._listener.join()
+
+    def listen(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                if self._stopped.is_set():
+                    break
+                logger.exception('Lost the realtime listener connection, reconnecting')
+                self.listening.clear()
+                time.sleep(1)
+
+    def _listen(self):
+        # A connection of its own, outside Django's per-thread handling
+        wrapper = connections['default']
+        listener = self._connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            self.listening.set()
+            
+            while not self._stopped.is_set():
+                if not select.select([listener], [], [], settings.REALTIME_KEEPALIVE_SECONDS)[0]:
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    message = json.loads(listener.notifies.pop(0).payload)
+                    super().publish(message['user_id'], message['event'])
+        finally:
+            listener.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.REALTIME_BROKER)()
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting == 'REALTIME_BROKER':
+        get_broker.cache_clear()
+
+
+def publish(user_id, event_type, data):
+    """Push an event to a user once the current transaction commits"""
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def publish_notifications(notifications):
+    """
+    Do the post_save handlers' work for notifications written with
+    bulk_create, which skips post_save
+    """
+    counters.invalidate('notifications', {notification.user_id for notification in notifications})
+    for notification in notifications:
+        publish(notification.user_id, 'notification', NotificationSerializer(notification).data)
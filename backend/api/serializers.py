@@ -1,14 +1,47 @@
 
 
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import authenticate
-from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession
-
-
-
-
-class UserSerializer(serializers.ModelSerializer):
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
+from django.db.models import Count, Prefetch
+from .authentication import ClaimsRefreshToken, activation_token_generator, add_claims
+from .throttling import metrics as login_metrics
+from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Conversation, Notification, Announcement, ScheduleSession, UserImport
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it reads so list views can
+    load them up front instead of issuing one query per row.
+    """
+
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    annotation_fields = {}
+    only_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.only_fields:
+            queryset = queryset.only(*cls.only_fields)
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        if cls.annotation_fields:
+            queryset = queryset.annotate(**cls.annotation_fields)
+        return queryset
+
+
+class UserSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('group',)
+
     # Include group details when serializing
     group_name = serializers.SerializerMethodField()
     group_id = serializers.SerializerMethodField()
@@ -30,7 +63,11 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.group.id if obj.group else None
 
 
-class UserSearchSerializer(serializers.ModelSerializer):
+class UserSearchSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    
+    # Search rows are small; skip the rest of the profile columns
+    only_fields = ('id', 'username', 'first_name', 'last_name', 'role', 'profile_picture')
+
     full_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -81,6 +118,58 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserImportRecordSerializer(serializers.Serializer):
+    """One row of a user import; the password may be left out when activation links are sent"""
+    
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False)
+    first_name = serializers.CharField(max_length=150, required=False)
+    last_name = serializers.CharField(max_length=150, required=False)
+    student_id = serializers.CharField(max_length=20, required=False)
+    program = serializers.CharField(max_length=100, required=False)
+    semester = serializers.IntegerField(min_value=1, max_value=10, required=False)
+    group = serializers.CharField(required=False)
+    password = serializers.CharField(min_length=8, required=False)
+    
+    def validate(self, data):
+        if not self.context.get('activation') and not data.get('password'):
+            raise serializers.ValidationError({'password': 'Required unless activation links are sent'})
+        return data
+
+
+class UserImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = [
+            'id', 'role', 'activation', 'status', 'total', 'processed',
+            'created', 'failed', 'results', 'created_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class AccountActivationSerializer(serializers.Serializer):
+    
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True, min_length=8)
+    
+    def validate(self, data):
+        try:
+            user_id = force_str(urlsafe_base64_decode(data['uid']))
+        except (TypeError, ValueError):
+            user_id = None
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id and user_id.isdigit() else None
+        
+        # The token is tied to the current password, so it only works once,
+        # and only accounts that never had a password can be activated
+        if (user is None or user.has_usable_password()
+                or not activation_token_generator.check_token(user, data['token'])):
+            raise serializers.ValidationError("Invalid or expired activation link")
+        
+        data['user'] = user
+        return data
+
+
 class LoginSerializer(serializers.Serializer):
     
     username = serializers.CharField()
@@ -90,11 +179,12 @@ class LoginSerializer(serializers.Serializer):
         username = data.get('username')
         password = data.get('password')
         
-        # Authenticate credentials
+        # Authenticate credentials; this is the one password hash per attempt
+        login_metrics.record_hash()
         user = authenticate(username=username, password=password)
         
         if not user:
-            raise serializers.ValidationError("Invalid credentials")
+            raise serializers.ValidationError("Invalid credentials", code='invalid_credentials')
         
         # Check if student is approved
         if user.role == User.STUDENT and not user.is_approved:
@@ -104,6 +194,23 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that rewrites the role, approval and group claims from
+    the current user row, so a refreshed access token picks up changes
+    made since login.
+    """
+    
+    def validate(self, attrs):
+        refresh = ClaimsRefreshToken(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.payload.get(jwt_settings.USER_ID_CLAIM), is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('No active account found for the given token.', 'no_active_account')
+        
+        add_claims(refresh, user)
+        return super().validate({**attrs, 'refresh': str(refresh)})
+
+
 class CourseSerializer(serializers.ModelSerializer):
     
     class Meta:
@@ -118,7 +225,9 @@ class CourseCreateSerializer(serializers.ModelSerializer):
         fields = ['code', 'name', 'description', 'credits']
 
 
-class ScheduleSessionSerializer(serializers.ModelSerializer):
+class ScheduleSessionSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('assignment__course', 'assignment__group', 'assignment__teacher')
+
     assignment_id = serializers.PrimaryKeyRelatedField(
         queryset=CourseAssignment.objects.all(), source='assignment', write_only=True
     )
@@ -147,7 +256,10 @@ class ScheduleSessionSerializer(serializers.ModelSerializer):
     def get_teacher_name(self, obj):
         return obj.assignment.teacher.get_full_name() if obj.assignment and obj.assignment.teacher else None
 
-class CourseAssignmentSerializer(serializers.ModelSerializer):
+class CourseAssignmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('teacher', 'course', 'group')
+    prefetch_related_fields = ('sessions',)
+
     teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
@@ -168,8 +280,11 @@ class CourseAssignmentSerializer(serializers.ModelSerializer):
 # GROUP SERIALIZERS
 # ============================================================================
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    prefetch_related_fields = ('courses',)
+    annotation_fields = {'student_count': Count('students', distinct=True)}
+
     student_count = serializers.SerializerMethodField()
     courses = CourseSerializer(many=True, read_only=True)
     
@@ -179,15 +294,18 @@ class GroupSerializer(serializers.ModelSerializer):
     
     def get_student_count(self, obj):
         """Count students in this group"""
-        return obj.students.count()
+        count = getattr(obj, 'student_count', None)
+        return obj.students.count() if count is None else count
 
 
 # ============================================================================
 # GRADE SERIALIZERS
 # ============================================================================
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('course', 'student')
+
     course_code = serializers.CharField(source='course.code', read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
@@ -212,12 +330,32 @@ class GradeUpdateSerializer(serializers.ModelSerializer):
         fields = ['td_mark', 'tp_mark', 'exam_mark', 'comments']
 
 
+class BulkGradeRecordSerializer(serializers.Serializer):
+    """One row of a mark sheet; omitted marks are left untouched"""
+    
+    student = serializers.IntegerField()
+    td_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, required=False, allow_null=True)
+    tp_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, required=False, allow_null=True)
+    exam_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, required=False, allow_null=True)
+    comments = serializers.CharField(required=False, allow_blank=True)
+
+
+
+class GradeAverageSerializer(serializers.Serializer):
+    
+    id = serializers.IntegerField()
+    student = serializers.IntegerField()
+    average = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+
+
 # ============================================================================
 # ATTENDANCE SERIALIZERS
 # ============================================================================
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('student', 'course')
+
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
     student_id = serializers.CharField(source='student.student_id', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
@@ -231,12 +369,24 @@ class AttendanceSerializer(serializers.ModelSerializer):
         ]
 
 
+class BulkAttendanceRecordSerializer(serializers.Serializer):
+    """One row of a roll call, validated without touching the database"""
+    
+    student = serializers.IntegerField()
+    course = serializers.IntegerField()
+    week_number = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=Attendance.STATUS_CHOICES, default=Attendance.PRESENT)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
 # ============================================================================
 # FILE SERIALIZERS
 # ============================================================================
 
-class CourseFileSerializer(serializers.ModelSerializer):
+class CourseFileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('course', 'uploaded_by')
+
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
     
@@ -254,8 +404,10 @@ class CourseFileSerializer(serializers.ModelSerializer):
 # TIMETABLE SERIALIZERS
 # ============================================================================
 
-class TimetableSerializer(serializers.ModelSerializer):
+class TimetableSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('group',)
+
     group_name = serializers.CharField(source='group.name', read_only=True)
     
     class Meta:
@@ -270,8 +422,11 @@ class TimetableSerializer(serializers.ModelSerializer):
 # NESTED SERIALIZERS FOR COMPLEX DATA
 # ============================================================================
 
-class StudentDetailSerializer(serializers.ModelSerializer):
+class StudentDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    select_related_fields = ('group',)
+    annotation_fields = {'grade_count': Count('grades', distinct=True)}
+
     group_name = serializers.SerializerMethodField()
     grade_count = serializers.SerializerMethodField()
     
@@ -289,11 +444,14 @@ class StudentDetailSerializer(serializers.ModelSerializer):
     
     def get_grade_count(self, obj):
         """How many courses this student has grades for"""
-        return obj.grades.count()
+        count = getattr(obj, 'grade_count', None)
+        return obj.grades.count() if count is None else count
 
 
-class TeacherDetailSerializer(serializers.ModelSerializer):
+class TeacherDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
+    annotation_fields = {'course_count': Count('teaching_assignments', distinct=True)}
+
     courses = CourseAssignmentSerializer(source='teaching_assignments', many=True, read_only=True)
     course_count = serializers.SerializerMethodField()
     
@@ -304,16 +462,25 @@ class TeacherDetailSerializer(serializers.ModelSerializer):
             'phone', 'courses', 'course_count'
         ]
     
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        assignments = CourseAssignmentSerializer.setup_eager_loading(CourseAssignment.objects.all())
+        queryset = super().setup_eager_loading(queryset)
+        return queryset.prefetch_related(Prefetch('teaching_assignments', queryset=assignments))
+
     def get_course_count(self, obj):
         """Number of courses this teacher is teaching"""
-        return obj.teaching_assignments.count()
+        count = getattr(obj, 'course_count', None)
+        return obj.teaching_assignments.count() if count is None else count
 
 
 # ============================================================================
 # INTERACTION SERIALIZERS (Messages & Notifications)
 # ============================================================================
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('sender', 'receiver')
+
     sender_name = serializers.SerializerMethodField()
     receiver_name = serializers.SerializerMethodField()
 
@@ -331,8 +498,84 @@ class MessageSerializer(serializers.ModelSerializer):
         return name if name else obj.receiver.username
 
 
+class ConversationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('peer', 'last_message')
+
+    peer_name = serializers.SerializerMethodField()
+    last_message = serializers.CharField(source='last_message.content', read_only=True, default=None)
+    last_message_sender = serializers.IntegerField(source='last_message.sender_id', read_only=True, default=None)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'peer', 'peer_name', 'last_message', 'last_message_sender', 'last_message_at', 'unread_count']
+
+    def get_peer_name(self, obj):
+        name = obj.peer.get_full_name().strip()
+        return name if name else obj.peer.username
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'user', 'title', 'message', 'notification_type', 'created_at', 'is_read']
         read_only_fields = ['created_at']
+
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    """Selects the notifications to mark read; no filter means all of them"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    up_to = serializers.IntegerField(required=False)
+    type = serializers.ChoiceField(choices=Notification.NOTIFICATION_TYPES, required=False)
+
+
+class MessageMarkReadSerializer(serializers.Serializer):
+    """Selects the received messages to mark read; no filter means all of them"""
+    with_user = serializers.IntegerField(required=False)
+    up_to = serializers.IntegerField(required=False)
+
+
+class AnnouncementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Announcement
+        fields = [
+            'id', 'title', 'message', 'notification_type',
+            'target', 'target_id', 'target_role',
+            'status', 'total', 'sent', 'created_at', 'finished_at'
+        ]
+        read_only_fields = ['status', 'total', 'sent', 'created_at', 'finished_at']
+
+    def validate(self, data):
+        target = data['target']
+        if target == Announcement.ROLE and not data.get('target_role'):
+            raise serializers.ValidationError({'target_role': 'Required when targeting a role'})
+        
+        if target in (Announcement.GROUP, Announcement.COURSE):
+            model = Group if target == Announcement.GROUP else Course
+            if not model.objects.filter(pk=data.get('target_id')).exists():
+                raise serializers.ValidationError({'target_id': f'{model.__name__} not found'})
+            
+            user = self.context['request'].user
+            if user.role == User.TEACHER:
+                lookup = 'group_id' if target == Announcement.GROUP else 'course_id'
+                if not CourseAssignment.objects.filter(teacher=user, **{lookup: data['target_id']}).exists():
+                    raise serializers.ValidationError({'target_id': 'You can only announce to your own groups and courses'})
+        elif self.context['request'].user.role != User.ADMIN:
+            raise serializers.ValidationError({'target': 'Only admins can announce to a role or the whole school'})
+        return data
+
+
+# ============================================================================
+# DASHBOARD SERIALIZERS
+# ============================================================================
+
+class DashboardCourseSerializer(serializers.Serializer):
+    
+    assignment_id = serializers.IntegerField()
+    course_id = serializers.IntegerField()
+    course_code = serializers.CharField()
+    course_name = serializers.CharField()
+    credits = serializers.IntegerField()
+    teacher_name = serializers.CharField()
+    average = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+    attendance_rate = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+    absences = serializers.IntegerField()
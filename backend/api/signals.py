@@ -0,0 +1,71 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, counters, grade_notifications, realtime
+from .authentication import invalidate_users
+from .models import Attendance, Course, CourseAssignment, Grade, Group, Message, Notification, ScheduleSession, Timetable, User
+from .serializers import MessageSerializer, NotificationSerializer
+
+
+@receiver(post_save, sender=Message)
+def push_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    counters.adjust('messages', instance.receiver_id, 1)
+    data = MessageSerializer(instance).data
+    realtime.publish(instance.receiver_id, 'message', data)
+    realtime.publish(instance.sender_id, 'message', data)
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if not instance.is_read:
+        counters.adjust('notifications', instance.user_id, 1)
+    realtime.publish(instance.user_id, 'notification', NotificationSerializer(instance).data)
+
+
+@receiver(post_save, sender=Grade)
+def schedule_grade_notifications(sender, instance, created, **kwargs):
+    if instance.notification_pending:
+        grade_notifications.schedule()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+    
+    # Catalog and grade responses show names, student ids and group sizes
+    changed = getattr(instance, 'changed_fields', set())
+    if kwargs.get('created', True) or changed.intersection(('role', 'group_id', 'first_name', 'last_name', 'student_id')):
+        caching.bump(User)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=CourseAssignment)
+@receiver(post_delete, sender=CourseAssignment)
+@receiver(post_save, sender=ScheduleSession)
+@receiver(post_delete, sender=ScheduleSession)
+@receiver(post_save, sender=Timetable)
+@receiver(post_delete, sender=Timetable)
+def bump_catalog_version(sender, **kwargs):
+    caching.bump(sender)
+
+
+@receiver(m2m_changed, sender=Group.courses.through)
+def bump_group_courses(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.bump(Group)
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def bump_student_version(sender, instance, **kwargs):
+    caching.bump(sender, owners=[instance.student_id])
@@ -0,0 +1,125 @@
+"""
+Campus Connect - Background tasks
+
+Slow side effects are queued as Task rows and run by the worker command
+(`python manage.py run_tasks`) instead of inside the request. A task is
+enqueued in the caller's transaction, so it only becomes visible to the
+worker once that transaction commits. Failed tasks are retried with
+exponential backoff, and an idempotency key makes enqueueing the same
+work twice a no-op.
+
+With TASKS_EAGER, the process that enqueued a task runs it once its
+transaction commits, or after its delay on a timer thread, so no worker
+is needed. Finished tasks are deleted after TASK_RETENTION seconds.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(name, max_attempts=3):
+    """Register a function as the handler of a task name"""
+    def register(func):
+        registry[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    func, max_attempts = registry[name]
+    Task.objects.bulk_create([Task(
+        name=name,
+        payload=payload or {},
+        idempotency_key=key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    )], ignore_conflicts=True)
+
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(delay))
+
+
+def run_eagerly(delay):
+    if delay <= 0:
+        run_pending()
+        return
+
+    def run_later():
+        try:
+            run_pending()
+        finally:
+            # This thread's own connections
+            connections.close_all()
+
+    timer = threading.Timer(delay, run_later)
+    timer.daemon = True
+    timer.start()
+
+
+def claim(limit):
+    """Lock a batch of due tasks for this worker"""
+    now = timezone.now()
+    stalled = now - timedelta(seconds=settings.TASK_TIMEOUT)
+    with transaction.atomic():
+        due = list(Task.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Task.PENDING, run_after__lte=now) |
+            Q(status=Task.RUNNING, updated_at__lt=stalled)
+        ).order_by('run_after').values_list('pk', flat=True)[:limit])
+        Task.objects.filter(pk__in=due).update(status=Task.RUNNING, attempts=F('attempts') + 1, updated_at=now)
+    return list(Task.objects.filter(pk__in=due))
+
+
+def run(task):
+    func, _ = registry.get(task.name, (None, None))
+    try:
+        if func is None:
+            raise LookupError(f'No handler registered for {task.name}')
+        func(**task.payload)
+    except Exception as exc:
+        logger.exception('Task %s (%s) failed', task.pk, task.name)
+        if task.attempts < task.max_attempts:
+            backoff = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.PENDING,
+                run_after=timezone.now() + timedelta(seconds=backoff),
+                last_error=repr(exc),
+                updated_at=timezone.now()
+            )
+        else:
+            Task.objects.filter(pk=task.pk).update(status=Task.FAILED, last_error=repr(exc), updated_at=timezone.now())
+        return False
+
+    Task.objects.filter(pk=task.pk).update(status=Task.DONE, last_error='', updated_at=timezone.now())
+    return True
+
+
+def prune():
+    """Delete tasks finished more than TASK_RETENTION seconds ago, at most once per TASK_PRUNE_INTERVAL"""
+    if not cache.add('tasks:pruned', True, timeout=settings.TASK_PRUNE_INTERVAL):
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_RETENTION)
+    deleted, _ = Task.objects.filter(status=Task.DONE, updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def run_pending(limit=None):
+    """Run one batch of due tasks, returning how many were claimed"""
+    prune()
+    claimed = claim(limit or settings.TASK_BATCH_SIZE)
+    for claimed_task in claimed:
+        run(claimed_task)
+    return len(claimed)
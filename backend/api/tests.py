@@ -1,3 +1,1246 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import announcements, counters, provisioning, realtime, tasks
+from .authentication import ClaimsRefreshToken, activation_token_generator
+from .throttling import LoginRateThrottle
+from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Conversation, Notification, ScheduleSession, Task, UserImport
+
+
+class ListQueryBudgetTests(APITestCase):
+    """
+    Every list endpoint must cost the same number of queries whatever
+    the number of rows it serializes. Grade lists include the aggregate
+    behind their ETag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        cls.group.courses.add(cls.course)
+        cls.assignment = CourseAssignment.objects.create(
+            teacher=cls.teacher, course=cls.course, group=cls.group, academic_year='2025-2026'
+        )
+        cls.student = cls.add_student()
+        User.objects.create_user('pending', password='x', role=User.STUDENT, group=cls.group)
+
+    @classmethod
+    def add_student(cls):
+        index = User.objects.count()
+        student = User.objects.create_user(
+            f'student{index}', password='x', role=User.STUDENT,
+            is_approved=True, group=cls.group, student_id=f'S{index}'
+        )
+        Grade.objects.create(student=student, course=cls.course, td_mark=10)
+        Group.objects.create(name=f'G{index}', academic_year='2025-2026').courses.add(cls.course)
+        User.objects.create_user(f'teacher{index}', password='x', role=User.TEACHER, is_approved=True)
+        Attendance.objects.create(student=student, course=cls.course, week_number=1)
+        CourseFile.objects.create(course=cls.course, uploaded_by=cls.teacher, title=f'File {index}', file='course_files/f.pdf')
+        Message.objects.create(sender=student, receiver=cls.teacher, content='hi')
+        Timetable.objects.create(group=cls.group, title=f'T{index}', image='timetables/t.png', academic_year='2025-2026')
+        ScheduleSession.objects.create(
+            assignment=cls.assignment, day='MONDAY', start_time='08:00', end_time='09:30', room=f'R{index}'
+        )
+        return student
+
+    def assertQueryBudget(self, user, url, budget):
+        self.client.force_authenticate(user)
+        for _ in range(2):
+            # Measure the database work, not the catalog cache
+            cache.clear()
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            for _ in range(3):
+                self.add_student()
+
+    def test_admin_endpoints(self):
+        budgets = {
+            '/api/admin/students/': 2,
+            '/api/admin/pending-students/': 2,
+            '/api/admin/teachers/': 4,
+            '/api/admin/assignments/': 3,
+            '/api/groups/': 3,
+            '/api/schedule/': 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.admin, url, budget)
+
+    def test_teacher_endpoints(self):
+        budgets = {
+            '/api/courses/my-courses/': 3,
+            '/api/grades/': 3,
+            '/api/attendance/': 2,
+            '/api/files/': 2,
+            '/api/messages/': 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.teacher, url, budget)
+
+    def test_student_endpoints(self):
+        budgets = {
+            '/api/courses/student-courses/': 3,
+            '/api/grades/my-grades/': 3,
+            '/api/attendance/my-attendance/': 2,
+            '/api/timetables/': 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.student, url, budget)
+
+    def test_course_grades_materializes_missing_rows(self):
+        url = f'/api/grades/course/{self.assignment.pk}/students/'
+        self.client.force_authenticate(self.teacher)
+        self.assertFalse(Grade.objects.filter(student__username='pending').exists())
+        
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(Grade.objects.filter(student__username='pending', course=self.course).exists())
+        
+        self.assertQueryBudget(self.teacher, url, 5)
+
+
+class BulkAttendanceTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        cls.other_course = Course.objects.create(code='C2', name='Course 2')
+        CourseAssignment.objects.create(teacher=cls.teacher, course=cls.course, group=cls.group, academic_year='2025-2026')
+        cls.students = [
+            User.objects.create_user(f'student{i}', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+            for i in range(5)
+        ]
+
+    def post_roll_call(self, records):
+        self.client.force_authenticate(self.teacher)
+        return self.client.post('/api/attendance/bulk/', {'attendance': records}, format='json')
+
+    def test_upserts_and_reports_rejected_records(self):
+        Attendance.objects.create(student=self.students[0], course=self.course, week_number=1)
+        records = [
+            {'student': s.pk, 'course': self.course.pk, 'week_number': 1, 'status': Attendance.ABSENT}
+            for s in self.students
+        ]
+        records.append({'student': self.students[0].pk, 'course': self.other_course.pk, 'week_number': 1})
+        records.append({'student': self.students[0].pk, 'course': self.course.pk, 'week_number': 1, 'status': 'GONE'})
+        
+        response = self.post_roll_call(records)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual([e['index'] for e in response.data['errors']], [5, 6])
+        self.assertEqual(Attendance.objects.filter(course=self.course, status=Attendance.ABSENT).count(), 5)
+
+    def test_body_must_be_an_object_with_a_list(self):
+        self.client.force_authenticate(self.teacher)
+        for body in [[{'student': self.students[0].pk}], {'attendance': 'all'}]:
+            response = self.client.post('/api/attendance/bulk/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_roll_call(self):
+        for week, students in [(1, self.students[:2]), (2, self.students)]:
+            records = [{'student': s.pk, 'course': self.course.pk, 'week_number': week} for s in students]
+            with self.assertNumQueries(6):
+                self.post_roll_call(records)
+
+
+class BulkGradeTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        cls.assignment = CourseAssignment.objects.create(
+            teacher=cls.teacher, course=cls.course, group=cls.group, academic_year='2025-2026'
+        )
+        cls.students = [
+            User.objects.create_user(f'student{i}', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+            for i in range(3)
+        ]
+        cls.url = f'/api/grades/course/{cls.assignment.pk}/bulk/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.teacher)
+
+    def test_json_sheet_returns_database_averages(self):
+        sheet = [
+            {'student': self.students[0].pk, 'td_mark': 10, 'tp_mark': 14, 'exam_mark': 12},
+            {'student': self.students[1].pk, 'exam_mark': 15},
+            {'student': self.students[2].pk, 'exam_mark': 21},
+        ]
+        response = self.client.post(self.url, {'grades': sheet}, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [2])
+        averages = {row['student']: row['average'] for row in response.data['averages']}
+        self.assertEqual(averages, {self.students[0].pk: '12.00', self.students[1].pk: '15.00', self.students[2].pk: None})
+
+    def test_rejected_sheet_leaves_no_rows_behind(self):
+        outsider = User.objects.create_user('outsider', password='x', role=User.STUDENT, is_approved=True)
+        sheet = [{'student': outsider.pk, 'exam_mark': 12}, {'student': self.students[0].pk, 'exam_mark': 25}]
+        response = self.client.post(self.url, {'grades': sheet}, format='json')
+        
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual([e['index'] for e in response.data['errors']], [0, 1])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_body_must_be_an_object_with_a_list(self):
+        for body in [[{'student': self.students[0].pk, 'exam_mark': 12}], {'grades': 'all'}]:
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_csv_sheet_leaves_blank_cells_untouched(self):
+        Grade.objects.create(student=self.students[0], course=self.course, td_mark=8)
+        upload = SimpleUploadedFile('sheet.csv', f'student,td_mark,exam_mark\n{self.students[0].pk},,16\n'.encode())
+        
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, 200)
+        grade = Grade.objects.get(student=self.students[0], course=self.course)
+        self.assertEqual((grade.td_mark, grade.exam_mark), (8, 16))
+
+    def test_ranking_and_statistics_use_stored_average(self):
+        for student, mark in zip(self.students, [8, 15, None]):
+            Grade.objects.create(student=student, course=self.course, exam_mark=mark)
+        
+        response = self.client.get(f'/api/grades/?course_id={self.course.pk}&ordering=-average')
+        ranking = [self.students[1].pk, self.students[0].pk, self.students[2].pk]
+        self.assertEqual([row['student'] for row in response.data['results']], ranking)
+        
+        response = self.client.get('/api/grades/?average_below=10')
+        self.assertEqual([row['student'] for row in response.data['results']], [self.students[0].pk])
+        
+        response = self.client.get(f'/api/grades/course/{self.assignment.pk}/statistics/')
+        self.assertEqual((response.data['graded'], response.data['below_ten']), (2, 1))
+
+
+class ConversationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='x', role=User.TEACHER, is_approved=True)
+        cls.bob = User.objects.create_user('bob', password='x', role=User.STUDENT, is_approved=True)
+        cls.carol = User.objects.create_user('carol', password='x', role=User.STUDENT, is_approved=True)
+
+    def send(self, sender, receiver, content):
+        self.client.force_authenticate(sender)
+        response = self.client.post('/api/messages/', {'receiver': receiver.pk, 'content': content}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def inbox(self, user):
+        self.client.force_authenticate(user)
+        rows = self.client.get('/api/messages/conversations/').data['results']
+        return {row['peer']: (row['last_message'], row['last_message_at'], row['unread_count']) for row in rows}
+
+    def test_inbox_tracks_last_message_and_unread(self):
+        self.send(self.bob, self.alice, 'first')
+        self.send(self.carol, self.alice, 'hello')
+        self.send(self.bob, self.alice, 'second')
+        self.send(self.alice, self.bob, 'reply')
+        
+        inbox = self.inbox(self.alice)
+        self.assertEqual(inbox[self.bob.pk][0], 'reply')
+        self.assertEqual(inbox[self.bob.pk][2], 2)
+        self.assertEqual(inbox[self.carol.pk][2], 1)
+        self.assertEqual(self.inbox(self.bob)[self.alice.pk][2], 1)
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.send(self.bob, self.alice, 'first')
+        self.send(self.alice, self.bob, 'reply')
+        self.send(self.carol, self.alice, 'hello')
+        before = self.inbox(self.alice)
+        
+        call_command('rebuild_conversations', stdout=StringIO())
+        
+        self.assertEqual(self.inbox(self.alice), before)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='x', role=User.TEACHER, is_approved=True)
+        cls.bob = User.objects.create_user('bob', password='x', role=User.STUDENT, is_approved=True)
+        cls.messages = [Message.objects.create(sender=cls.bob, receiver=cls.alice, content=str(i)) for i in range(5)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.alice)
+
+    def contents(self, response):
+        return [row['content'] for row in response.data['results']]
+
+    def test_walks_back_through_history_in_chat_order(self):
+        page = self.client.get(f'/api/messages/?with_user={self.bob.pk}&page_size=2')
+        self.assertEqual(self.contents(page), ['3', '4'])
+        
+        page = self.client.get(page.data['older'])
+        self.assertEqual(self.contents(page), ['1', '2'])
+        
+        page = self.client.get(page.data['older'])
+        self.assertEqual(self.contents(page), ['0'])
+        self.assertIsNone(page.data['older'])
+
+    def test_newer_cursor_returns_only_the_delta(self):
+        page = self.client.get(f'/api/messages/?with_user={self.bob.pk}')
+        poll = page.data['newer']
+        self.assertEqual(self.contents(self.client.get(poll)), [])
+        
+        Message.objects.create(sender=self.bob, receiver=self.alice, content='new')
+        self.assertEqual(self.contents(self.client.get(poll)), ['new'])
+
+    def test_notifications_are_newest_first(self):
+        for i in range(3):
+            self.alice.notifications.create(title=str(i), message='m')
+        response = self.client.get('/api/notifications/?page_size=2')
+        self.assertEqual([row['title'] for row in response.data['results']], ['2', '1'])
+        response = self.client.get(response.data['older'])
+        self.assertEqual([row['title'] for row in response.data['results']], ['0'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are checked against PostgreSQL')
+class HotQueryIndexTests(APITestCase):
+    """
+    The hot access paths must be able to use their composite or partial
+    index. Sequential scans are disabled so the planner's choice does
+    not depend on the size of the test tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', password='x')
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_hot_queries_use_their_index(self):
+        user = self.user
+        hot_queries = [
+            (Message.objects.filter(sender=user, receiver=user).order_by('timestamp'), 'message_thread_idx'),
+            (Message.objects.filter(receiver=user, is_read=False), 'message_unread_idx'),
+            (Notification.objects.filter(user=user), 'notification_user_recent_idx'),
+            (Notification.objects.filter(user=user, is_read=False), 'notification_unread_idx'),
+            (Attendance.objects.filter(course_id=1, week_number=1), 'attendance_course_week_idx'),
+            (Grade.objects.filter(course_id=1, student_id=1), 'grade_course_student_idx'),
+            (User.objects.filter(role=User.TEACHER, is_approved=True), 'user_role_approved_idx'),
+            (User.objects.filter(role=User.STUDENT, is_approved=False), 'user_pending_students_idx'),
+            (Timetable.objects.filter(group_id=1, is_active=True), 'timetable_active_idx'),
+            (ScheduleSession.objects.filter(assignment_id=1, day='MONDAY'), 'session_assignment_day_idx'),
+            (User.objects.filter(is_searchable=True).order_by('username'), 'user_searchable_idx'),
+            (User.objects.filter(last_name__trigram_word_similar='benali'), 'user_search_trgm_idx'),
+        ]
+        for queryset, index_name in hot_queries:
+            with self.subTest(index=index_name):
+                self.assertUsesIndex(queryset, index_name)
+
+
+@override_settings(REALTIME_BROKER='api.realtime.InProcessBroker')
+class RealtimeTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='x', role=User.TEACHER, is_approved=True)
+        cls.bob = User.objects.create_user('bob', password='x', role=User.STUDENT, is_approved=True)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, user):
+        async def subscribe():
+            return realtime.get_broker().subscribe(user.pk)
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(realtime.get_broker().unsubscribe, subscription)
+        return subscription
+
+    def next_event(self, subscription):
+        return self.loop.run_until_complete(asyncio.wait_for(subscription.queue.get(), 1))
+
+    def test_new_message_and_notification_are_pushed_after_commit(self):
+        subscription = self.subscribe(self.alice)
+        self.client.force_authenticate(self.bob)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/messages/', {'receiver': self.alice.pk, 'content': 'hi'}, format='json')
+            tasks.run_pending()
+        
+        events = [self.next_event(subscription) for _ in range(2)]
+        self.assertEqual(sorted(event['type'] for event in events), ['message', 'notification'])
+
+    def test_stream_requires_a_valid_token(self):
+        self.assertEqual(self.client.get('/api/stream/', HTTP_AUTHORIZATION='Bearer garbage').status_code, 401)
+
+    def test_stream_ignores_tokens_in_the_query_string(self):
+        access = ClaimsRefreshToken.for_user(self.bob).access_token
+        self.assertEqual(self.client.get(f'/api/stream/?token={access}').status_code, 401)
+
+    def test_stream_is_refused_under_wsgi(self):
+        access = ClaimsRefreshToken.for_user(self.bob).access_token
+        response = self.client.get('/api/stream/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 501)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY needs PostgreSQL')
+class CrossProcessRealtimeTests(TransactionTestCase):
+    """Jobs run by the worker process reach streams served by another process"""
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        overrides = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}},
+            REALTIME_BROKER='api.realtime.PostgresBroker',
+            TASKS_EAGER=False
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_worker_notification_reaches_stream_and_badge(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        message = Message.objects.create(sender=bob, receiver=alice, content='hi')
+        tasks.enqueue('notify_message', {'message_id': message.pk})
+        self.assertEqual(counters.get_unread_counts(alice.pk)['notifications'], 0)
+        
+        async def scenario():
+            broker = realtime.get_broker()
+            subscription = broker.subscribe(alice.pk)
+            self.addCleanup(broker.stop)
+            loop = asyncio.get_running_loop()
+            self.assertTrue(await loop.run_in_executor(None, broker.listening.wait, 5))
+            
+            # The forked worker opens its own database connection
+            connections.close_all()
+            worker = multiprocessing.get_context('fork').Process(
+                target=call_command, args=('run_tasks', '--once'), kwargs={'stdout': StringIO()}
+            )
+            worker.start()
+            await loop.run_in_executor(None, worker.join, 30)
+            self.assertEqual(worker.exitcode, 0)
+            return await asyncio.wait_for(subscription.queue.get(), 5)
+        
+        event = asyncio.run(scenario())
+        self.assertEqual((event['type'], event['data']['title']), ('notification', 'New Message from bob'))
+        self.assertEqual(counters.get_unread_counts(alice.pk)['notifications'], 1)
+
+
+class UnreadCountTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='x', role=User.TEACHER, is_approved=True)
+        cls.bob = User.objects.create_user('bob', password='x', role=User.STUDENT, is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.alice)
+
+    def counts(self):
+        return self.client.get('/api/unread-counts/').data
+
+    def test_counters_follow_creation_and_mark_read(self):
+        self.assertEqual(self.counts(), {'notifications': 0, 'messages': 0})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.bob, receiver=self.alice, content='hi')
+            notification = Notification.objects.create(user=self.alice, title='t', message='m')
+        self.assertEqual(self.counts(), {'notifications': 1, 'messages': 1})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{notification.pk}/read/')
+            self.client.post(f'/api/notifications/{notification.pk}/read/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), {'notifications': 0, 'messages': 1})
+
+    def test_missing_counter_is_recounted_from_the_table(self):
+        Notification.objects.create(user=self.alice, title='t', message='m')
+        cache.clear()
+        self.assertEqual(self.counts()['notifications'], 1)
+
+    def test_bulk_mark_read_is_one_update(self):
+        for kind in ['GRADE', 'GRADE', 'INFO']:
+            Notification.objects.create(user=self.alice, title='t', message='m', notification_type=kind)
+        
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/notifications/mark-read/', {'type': 'GRADE'}, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(self.counts()['notifications'], 1)
+
+    def test_mark_conversation_read_resets_its_unread_count(self):
+        self.client.force_authenticate(self.bob)
+        for content in ['one', 'two']:
+            self.client.post('/api/messages/', {'receiver': self.alice.pk, 'content': content}, format='json')
+        
+        self.client.force_authenticate(self.alice)
+        response = self.client.post('/api/messages/mark-read/', {'with_user': self.bob.pk}, format='json')
+        
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(Conversation.objects.get(owner=self.alice, peer=self.bob).unread_count, 0)
+        self.assertEqual(self.counts()['messages'], 0)
+
+
+class AnnouncementTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.other_group = Group.objects.create(name='G2', academic_year='2025-2026')
+        for i in range(7):
+            User.objects.create_user(f'student{i}', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+        User.objects.create_user('outsider', password='x', role=User.STUDENT, is_approved=True, group=cls.other_group)
+
+    @override_settings(ANNOUNCEMENT_BATCH_SIZE=3)
+    def test_group_announcement_is_written_in_batches(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post('/api/notifications/announcements/', {
+            'title': 'Exam', 'message': 'Monday 8am', 'notification_type': 'EXAM',
+            'target': 'GROUP', 'target_id': self.group.pk
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        
+        with self.assertNumQueries(3 + 3 * 4 + 1):
+            announcements.deliver(response.data['id'])
+        self.assertEqual(Task.objects.get().name, 'deliver_announcement')
+        
+        progress = self.client.get(f"/api/notifications/announcements/{response.data['id']}/").data
+        self.assertEqual((progress['status'], progress['total'], progress['sent']), ('DONE', 7, 7))
+        self.assertEqual(Notification.objects.filter(notification_type='EXAM').count(), 7)
+
+    def test_teacher_course_announcement_reaches_only_their_groups(self):
+        course = Course.objects.create(code='C1', name='Course 1')
+        other_teacher = User.objects.create_user('other', password='x', role=User.TEACHER, is_approved=True)
+        for group, teacher in ((self.group, self.teacher), (self.other_group, other_teacher)):
+            group.courses.add(course)
+            CourseAssignment.objects.create(teacher=teacher, course=course, group=group, academic_year='2025-2026')
+        
+        self.client.force_authenticate(self.teacher)
+        response = self.client.post('/api/notifications/announcements/', {
+            'title': 'Quiz', 'message': 'Friday', 'target': 'COURSE', 'target_id': course.pk
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        
+        announcements.deliver(response.data['id'])
+        self.assertEqual(Notification.objects.filter(title='Quiz').count(), 7)
+        self.assertFalse(Notification.objects.filter(title='Quiz', user__username='outsider').exists())
+
+    def test_teacher_cannot_announce_to_a_foreign_group(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.post('/api/notifications/announcements/', {
+            'title': 'Exam', 'message': 'Monday 8am', 'target': 'GROUP', 'target_id': self.group.pk
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskQueueTests(APITestCase):
+
+    def setUp(self):
+        self.calls = []
+        tasks.task('test_record')(lambda value: self.calls.append(value))
+        tasks.task('test_fail', max_attempts=2)(lambda: 1 / 0)
+        self.addCleanup(tasks.registry.pop, 'test_record')
+        self.addCleanup(tasks.registry.pop, 'test_fail')
+
+    def test_idempotency_key_enqueues_once(self):
+        for _ in range(3):
+            tasks.enqueue('test_record', {'value': 1}, key='only-once')
+        
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        tasks.enqueue('test_fail')
+        
+        tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_after, timezone.now())
+        self.assertEqual(tasks.run_pending(), 0)
+        
+        Task.objects.update(run_after=timezone.now())
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertIn('ZeroDivisionError', task.last_error)
+
+    def test_worker_warns_about_a_process_local_cache_and_runs(self):
+        tasks.enqueue('test_record', {'value': 1})
+        stderr = StringIO()
+        call_command('run_tasks', '--once', stdout=StringIO(), stderr=stderr)
+        
+        self.assertEqual(self.calls, [1])
+        self.assertIn('UNREAD_COUNT_TTL', stderr.getvalue())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_tasks_run_after_commit_or_on_a_timer(self):
+        with mock.patch('api.tasks.threading.Timer') as timer:
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.enqueue('test_record', {'value': 1})
+                tasks.enqueue('test_record', {'value': 2}, delay=60)
+        
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(timer.call_args.args[0], 60)
+        timer.return_value.start.assert_called_once_with()
+
+    def test_finished_tasks_are_pruned(self):
+        for key, status in (('old', Task.DONE), ('recent', Task.DONE), ('failed', Task.FAILED)):
+            Task.objects.create(name='test_record', idempotency_key=key, status=status, run_after=timezone.now())
+        Task.objects.exclude(idempotency_key='recent').update(
+            updated_at=timezone.now() - timedelta(seconds=settings.TASK_RETENTION + 60)
+        )
+        cache.delete('tasks:pruned')
+        
+        tasks.run_pending()
+        self.assertEqual(set(Task.objects.values_list('idempotency_key', flat=True)), {'recent', 'failed'})
+
+    def test_sending_a_message_queues_the_receiver_notification(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        self.client.force_authenticate(bob)
+        self.client.post('/api/messages/', {'receiver': alice.pk, 'content': 'hi'}, format='json')
+        
+        self.assertFalse(alice.notifications.exists())
+        tasks.run_pending()
+        self.assertEqual(alice.notifications.get().title, 'New Message from bob')
+
+
+class GradeNotificationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        cls.assignment = CourseAssignment.objects.create(
+            teacher=cls.teacher, course=cls.course, group=cls.group, academic_year='2025-2026'
+        )
+        cls.students = [
+            User.objects.create_user(f'student{i}', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.teacher)
+
+    def run_due_tasks(self):
+        Task.objects.update(run_after=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.run_pending()
+
+    def test_repeated_edits_coalesce_into_one_notification(self):
+        grade = Grade.objects.create(student=self.students[0], course=self.course)
+        for mark in (8, 9, 11):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/grades/{grade.pk}/', {'exam_mark': mark}, format='json')
+            self.assertEqual(response.status_code, 200)
+        
+        self.assertEqual(Task.objects.filter(name='publish_grade_notifications').count(), 1)
+        self.assertGreater(Task.objects.get().run_after, timezone.now())
+        
+        self.run_due_tasks()
+        notification = Notification.objects.get()
+        self.assertEqual((notification.user, notification.notification_type), (self.students[0], 'GRADE'))
+
+    def test_bulk_sheet_notifies_students_with_marks(self):
+        sheet = [
+            {'student': self.students[0].pk, 'exam_mark': 12},
+            {'student': self.students[1].pk, 'comments': 'absent'},
+            {'student': self.students[2].pk, 'td_mark': 15},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/grades/course/{self.assignment.pk}/bulk/', {'grades': sheet}, format='json')
+        
+        self.run_due_tasks()
+        self.assertEqual(
+            set(Notification.objects.values_list('user', flat=True)),
+            {self.students[0].pk, self.students[2].pk}
+        )
+
+    def test_save_committed_after_its_window_ran_is_still_sent(self):
+        grade = Grade.objects.create(student=self.students[1], course=self.course)
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.students[0], course=self.course, exam_mark=10)
+        self.run_due_tasks()
+        self.assertEqual(Notification.objects.get().user, self.students[0])
+        
+        # Saved during the window whose task just ran, committed afterwards
+        with self.captureOnCommitCallbacks() as callbacks:
+            grade.exam_mark = 14
+            grade.save()
+        later = timezone.now() + timedelta(seconds=settings.GRADE_NOTIFICATION_WINDOW)
+        with mock.patch.object(timezone, 'now', return_value=later):
+            for callback in callbacks:
+                callback()
+        self.run_due_tasks()
+        self.assertEqual(Notification.objects.filter(user=self.students[1]).count(), 1)
+        self.assertFalse(Grade.objects.filter(notification_pending=True).exists())
+
+
+class UserSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.target = User.objects.create_user(
+            'ybenali', password='x', first_name='Yasmine', last_name='Benali', role=User.TEACHER, is_approved=True
+        )
+        User.objects.bulk_create([
+            User(username=f'benali{i}', last_name='Benali', role=User.TEACHER, is_approved=True) for i in range(30)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def test_results_are_capped(self):
+        response = self.client.get('/api/users/search/', {'search': 'benali', 'page_size': 100})
+        
+        self.assertEqual(response.data['count'], 31)
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_only_searchable_users_are_listed(self):
+        User.objects.filter(username__startswith='benali').delete()
+        User.objects.create_user('pending', password='x', role=User.STUDENT)
+        User.objects.create_user('gone', password='x', role=User.TEACHER, is_active=False)
+        User.objects.create_user('staff', password='x', role=User.STUDENT, is_staff=True)
+        
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/users/search/')
+        
+        usernames = {row['username'] for row in response.data['results']}
+        self.assertIn('staff', usernames)
+        self.assertNotIn('pending', usernames)
+        self.assertNotIn('gone', usernames)
+        self.assertNotIn('admin', usernames)
+
+    def test_student_is_found_by_part_of_their_id(self):
+        student = User.objects.create_user(
+            'kamel', password='x', role=User.STUDENT, is_approved=True, student_id='ETU2024017'
+        )
+        response = self.client.get('/api/users/search/', {'search': '2024017'})
+        
+        self.assertEqual([row['id'] for row in response.data['results']], [student.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram search needs PostgreSQL')
+    def test_misspelled_prefix_ranks_the_closest_match_first(self):
+        response = self.client.get('/api/users/search/', {'search': 'yasmin benal'})
+        
+        self.assertEqual(response.data['results'][0]['id'], self.target.pk)
+
+
+class CachedAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.user = User.objects.create_user('student', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.refresh = ClaimsRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_user_is_resolved_from_the_token_claims(self):
+        self.client.get('/api/unread-counts/')
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/unread-counts/')
+        self.assertEqual(response.status_code, 200)
+        
+        # Only the timetable query itself; the group comes from the token
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/timetables/my-timetable/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_changing_a_claimed_field_invalidates_old_tokens(self):
+        self.client.get('/api/unread-counts/')
+        other = Group.objects.create(name='G2', academic_year='2025-2026')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.group = other
+            self.user.save()
+        
+        response = self.client.get('/api/unread-counts/')
+        self.assertEqual(response.status_code, 401)
+        
+        response = self.client.post('/api/auth/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(AccessToken(response.data['access'])['group_id'], other.pk)
+
+    def test_deactivated_users_are_rejected(self):
+        self.client.get('/api/unread-counts/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        
+        response = self.client.get('/api/unread-counts/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile_loads_the_full_user(self):
+        response = self.client.get('/api/auth/profile/')
+        
+        self.assertEqual((response.data['username'], response.data['group_name']), ('student', 'G1'))
+
+
+class LogoutTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='x', role=User.STUDENT, is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'username': 'student', 'password': 'x'}, format='json')
+        return response.data['access'], response.data['refresh']
+
+    def test_logout_revokes_both_tokens(self):
+        access, refresh = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get('/api/unread-counts/')
+        
+        response = self.client.post('/api/auth/logout/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/unread-counts/')
+        self.assertEqual(response.status_code, 401)
+        self.client.credentials()
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation_outlives_the_cache(self):
+        access, _ = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.post('/api/auth/logout/')
+        
+        # As seen by another process, or after a restart
+        cache.clear()
+        self.assertEqual(self.client.get('/api/unread-counts/').status_code, 401)
+
+    def test_tokens_without_a_version_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get('/api/unread-counts/').status_code, 401)
+
+    def test_logout_all_ends_every_session(self):
+        phone, phone_refresh = self.login()
+        laptop, _ = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {laptop}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/logout-all/')
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {phone}')
+        self.assertEqual(self.client.get('/api/unread-counts/').status_code, 401)
+        self.client.credentials()
+        response = self.client.post('/api/auth/refresh/', {'refresh': phone_refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(TASKS_EAGER=False)
+class UserImportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, text, **data):
+        upload = SimpleUploadedFile('intake.csv', text.encode())
+        response = self.client.post('/api/admin/users/import/', {'file': upload, **data}, format='multipart')
+        self.assertEqual((response.status_code, response.data['status']), (202, UserImport.PENDING))
+        
+        tasks.run_pending()
+        return self.client.get(f"/api/admin/users/import/{response.data['id']}/")
+
+    @override_settings(USER_IMPORT_BATCH_SIZE=4)
+    def test_each_row_is_reported(self):
+        response = self.upload(
+            'username,first_name,student_id,group,password\n'
+            'amina,Amina,S1,G1,password1\n'
+            'amina,Duplicate,S2,G1,password2\n'
+            'admin,Taken,S3,G1,password3\n'
+            'karim,Karim,S4,G9,password4\n'
+            'lina,Lina,S5,,\n'
+            'omar,Omar,,G1,password6\n'
+        )
+        
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 4))
+        statuses = [(r['row'], r['status'], sorted(r.get('errors', {}))) for r in response.data['results']]
+        self.assertEqual(statuses, [
+            (1, 'created', []),
+            (2, 'error', ['username']),
+            (3, 'error', ['username']),
+            (4, 'error', ['group']),
+            (5, 'error', ['password']),
+            (6, 'created', []),
+        ])
+        amina = User.objects.get(username='amina')
+        self.assertEqual((amina.role, amina.group, amina.is_approved), (User.STUDENT, self.group, True))
+        self.assertTrue(amina.check_password('password1'))
+        
+        # The passwords are not kept once the import is done
+        self.assertEqual((response.data['status'], response.data['processed']), (UserImport.DONE, 6))
+        self.assertEqual(UserImport.objects.get().rows, [])
+
+    def test_passwords_need_the_worker(self):
+        with override_settings(TASKS_EAGER=True):
+            response = self.client.post('/api/admin/users/import/', {
+                'file': SimpleUploadedFile('intake.csv', b'username,password\namina,password1\n')
+            }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserImport.objects.exists())
+
+    def test_conflicting_rows_do_not_abort_the_batch(self):
+        def hash_while_another_admin_imports(passwords, workers):
+            User.objects.create_user('karim', password='x')
+            return [make_password(password) for password in passwords]
+        
+        with mock.patch.object(provisioning, 'hash_passwords', side_effect=hash_while_another_admin_imports):
+            response = self.upload(
+                'username,password\n'
+                'amina,password1\n'
+                'karim,password2\n'
+                'lina,password3\n'
+            )
+        
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'created'])
+        self.assertTrue(User.objects.filter(username='lina').exists())
+
+    def test_activation_link_sets_the_password_once(self):
+        response = self.upload('username,email\nsofia,sofia@example.com\n', activation='true')
+        
+        uid, token = response.data['results'][0]['activation_url'].strip('/').split('/')[-2:]
+        self.assertFalse(User.objects.get(username='sofia').has_usable_password())
+        
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/auth/activate/', {'uid': uid, 'token': token, 'password': 'new-password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertTrue(User.objects.get(username='sofia').check_password('new-password'))
+        
+        response = self.client.post('/api/auth/activate/', {'uid': uid, 'token': token, 'password': 'other-password'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_password_reset_tokens_do_not_activate(self):
+        self.upload('username\nsofia\n', activation='true')
+        sofia = User.objects.get(username='sofia')
+        uid = urlsafe_base64_encode(force_bytes(sofia.pk))
+        
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/auth/activate/', {
+            'uid': uid, 'token': default_token_generator.make_token(sofia), 'password': 'new-password'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        
+        # Nor can a link be used on an account that already has a password
+        response = self.client.post('/api/auth/activate/', {
+            'uid': urlsafe_base64_encode(force_bytes(self.admin.pk)),
+            'token': activation_token_generator.make_token(self.admin),
+            'password': 'new-password'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_passwords_are_hashed_across_processes(self):
+        hashes = provisioning.hash_passwords([f'password{i}' for i in range(8)], workers=2)
+        
+        self.assertEqual(len(set(hashes)), 8)
+        self.assertTrue(check_password('password3', hashes[3]))
+
+
+class LoginLimitTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='right-password', role=User.STUDENT, is_approved=True)
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, password, username='student', address='127.0.0.1', **extra):
+        return self.client.post(
+            '/api/auth/login/', {'username': username, 'password': password}, format='json', REMOTE_ADDR=address, **extra
+        )
+
+    def test_failed_attempts_lock_the_username_before_hashing(self):
+        for _ in range(10):
+            self.assertEqual(self.login('wrong').status_code, 400)
+        
+        with mock.patch('api.serializers.authenticate') as authenticate:
+            response = self.login('right-password')
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+        
+        self.client.force_authenticate(self.admin)
+        metrics = self.client.get('/api/admin/login-metrics/').data
+        self.assertGreaterEqual(metrics['rejected_by_username'], 1)
+        self.assertGreater(metrics['hashes_per_second'], 0)
+
+    def test_guessing_cannot_lock_the_owner_out_from_elsewhere(self):
+        for _ in range(10):
+            self.login('wrong', address='203.0.113.7')
+        self.assertEqual(self.login('right-password', address='203.0.113.7').status_code, 429)
+        
+        self.assertEqual(self.login('right-password', address='198.51.100.20').status_code, 200)
+
+    def test_successful_login_clears_failures(self):
+        for _ in range(9):
+            self.login('wrong')
+        self.assertEqual(self.login('right-password').status_code, 200)
+        
+        for _ in range(9):
+            self.login('wrong')
+        self.assertEqual(self.login('right-password').status_code, 200)
+
+    def test_forwarded_addresses_are_not_trusted(self):
+        for attempt in range(10):
+            self.login('wrong', HTTP_X_FORWARDED_FOR=f'198.51.100.{attempt}')
+        
+        response = self.login('right-password', HTTP_X_FORWARDED_FOR='198.51.100.99')
+        self.assertEqual(response.status_code, 429)
+
+    def test_guessing_from_many_addresses_is_capped_per_username(self):
+        self.assertEqual(self.login('right-password', address='198.51.100.20').status_code, 200)
+        
+        with mock.patch.dict(LoginRateThrottle.THROTTLE_RATES, {'login_username': '5/hour'}):
+            for attempt in range(5):
+                self.assertEqual(self.login('wrong', address=f'203.0.113.{attempt}').status_code, 400)
+            self.assertEqual(self.login('right-password', address='203.0.113.99').status_code, 429)
+            
+            # The owner's own address is not held back
+            self.assertEqual(self.login('right-password', address='198.51.100.20').status_code, 200)
+
+    def test_failures_are_limited_per_address(self):
+        with mock.patch.dict(LoginRateThrottle.THROTTLE_RATES, {'login': '2/min'}):
+            self.login('wrong', username='nobody1')
+            self.login('wrong', username='nobody2')
+            self.assertEqual(self.login('wrong', username='nobody3').status_code, 429)
+
+    def test_successful_logins_behind_one_address_are_not_limited(self):
+        with mock.patch.dict(LoginRateThrottle.THROTTLE_RATES, {'login': '2/min'}):
+            for _ in range(3):
+                self.assertEqual(self.login('right-password').status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_outdated_hashes_are_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('right-password', hasher='md5'))
+        
+        self.assertEqual(self.login('right-password').status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith('pbkdf2_sha256$'))
+
+
+class CatalogCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.teacher = User.objects.create_user('teacher', password='x', first_name='Old', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        cls.student = User.objects.create_user('student', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lists_are_served_from_the_cache_until_a_write(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get('/api/courses/')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get('/api/courses/').data['results']), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/courses/', {'code': 'C2', 'name': 'Course 2'}, format='json')
+        self.assertEqual(len(self.client.get('/api/courses/').data['results']), 2)
+
+    def test_related_writes_retire_nested_responses(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/groups/').data['results'][0]['courses'], [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/courses/assign-to-group/', {'course_id': self.course.pk, 'group_id': self.group.pk}, format='json')
+            assignment = CourseAssignment.objects.create(
+                teacher=self.teacher, course=self.course, group=self.group, academic_year='2025-2026'
+            )
+        self.assertEqual(len(self.client.get('/api/groups/').data['results'][0]['courses']), 1)
+        
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/courses/student-courses/').data['results'][0]['teacher_name'], 'Old')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.first_name = 'New'
+            self.teacher.save()
+        self.assertEqual(self.client.get('/api/courses/student-courses/').data['results'][0]['id'], assignment.pk)
+        self.assertEqual(self.client.get('/api/courses/student-courses/').data['results'][0]['teacher_name'], 'New')
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ADMIN, is_approved=True)
+        cls.teacher = User.objects.create_user('teacher', password='x', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.course = Course.objects.create(code='C1', name='Course 1')
+        CourseAssignment.objects.create(teacher=cls.teacher, course=cls.course, group=cls.group, academic_year='2025-2026')
+        cls.student = User.objects.create_user('student', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+        cls.grade = Grade.objects.create(student=cls.student, course=cls.course, td_mark=10)
+        Timetable.objects.create(group=cls.group, title='T1', image='timetables/t.png', academic_year='2025-2026')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url, etag, queries=0, header=None):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=header or etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_catalog_etags_follow_model_versions(self):
+        self.client.force_authenticate(self.admin)
+        for url in ('/api/courses/', f'/api/courses/{self.course.pk}/', '/api/groups/', '/api/schedule/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertNotModified(url, etag)
+                self.assertNotModified(url, etag, header=f'"other", W/{etag}')
+        
+        etag = self.client.get('/api/courses/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/courses/{self.course.pk}/', {'name': 'Renamed'}, format='json')
+        response = self.client.get('/api/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+    def test_grade_etags_follow_the_rows(self):
+        self.client.force_authenticate(self.student)
+        etag = self.client.get('/api/grades/my-grades/')['ETag']
+        self.assertNotModified('/api/grades/my-grades/', etag, queries=1)
+        
+        self.client.force_authenticate(self.teacher)
+        self.client.patch(f'/api/grades/{self.grade.pk}/', {'exam_mark': 15}, format='json')
+        
+        self.client.force_authenticate(self.student)
+        response = self.client.get('/api/grades/my-grades/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etags_are_per_user(self):
+        self.client.force_authenticate(self.student)
+        etag = self.client.get('/api/timetables/my-timetable/')['ETag']
+        self.assertNotModified('/api/timetables/my-timetable/', etag)
+        
+        other = User.objects.create_user('other', password='x', role=User.STUDENT, is_approved=True, group=self.group)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/timetables/my-timetable/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class StudentDashboardTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='x', first_name='Ada', last_name='Byron', role=User.TEACHER, is_approved=True)
+        cls.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        cls.student = User.objects.create_user('student', password='x', role=User.STUDENT, is_approved=True, group=cls.group)
+        cls.courses = [cls.add_course(index) for index in range(2)]
+        cls.grade = Grade.objects.create(student=cls.student, course=cls.courses[0], td_mark=12, exam_mark=16)
+        for week, status in enumerate([Attendance.PRESENT, Attendance.LATE, Attendance.ABSENT, Attendance.EXCUSED], start=1):
+            Attendance.objects.create(student=cls.student, course=cls.courses[0], week_number=week, status=status)
+        Timetable.objects.create(group=cls.group, title='Spring', image='timetables/t.png', academic_year='2025-2026')
+        Notification.objects.create(user=cls.student, title='Hi', message='Welcome')
+
+    @classmethod
+    def add_course(cls, index):
+        course = Course.objects.create(code=f'C{index}', name=f'Course {index}')
+        CourseAssignment.objects.create(teacher=cls.teacher, course=course, group=cls.group, academic_year='2025-2026')
+        return course
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.student)
+
+    def test_summary(self):
+        data = self.client.get('/api/dashboard/').data
+        
+        first, second = data['courses']
+        self.assertEqual(first['course_code'], 'C0')
+        self.assertEqual(first['teacher_name'], 'Ada Byron')
+        self.assertEqual(first['average'], '14.00')
+        self.assertEqual(first['attendance_rate'], '66.67')
+        self.assertEqual(first['absences'], 1)
+        self.assertIsNone(second['average'])
+        self.assertIsNone(second['attendance_rate'])
+        self.assertEqual(data['timetable']['title'], 'Spring')
+        self.assertEqual(data['unread'], {'notifications': 1, 'messages': 0})
+
+    def test_query_count_is_bounded_and_repeat_loads_are_cached(self):
+        with self.assertNumQueries(6):
+            self.client.get('/api/dashboard/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/')
+        
+        cache.clear()
+        for index in range(2, 6):
+            course = self.add_course(index)
+            Grade.objects.create(student=self.student, course=course, tp_mark=10)
+            Attendance.objects.create(student=self.student, course=course, week_number=1)
+        with self.assertNumQueries(6):
+            self.assertEqual(len(self.client.get('/api/dashboard/').data['courses']), 6)
+
+    def test_own_grades_and_attendance_retire_the_cached_summary(self):
+        self.client.get('/api/dashboard/')
+        
+        self.client.force_authenticate(self.teacher)
+        assignment = CourseAssignment.objects.get(course=self.courses[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/grades/course/{assignment.pk}/bulk/', {'grades': [{'student': self.student.pk, 'tp_mark': 20}]}, format='json')
+            self.client.post('/api/attendance/bulk/', {'attendance': [
+                {'student': self.student.pk, 'course': self.courses[1].pk, 'week_number': 1, 'status': Attendance.ABSENT}
+            ]}, format='json')
+        
+        self.client.force_authenticate(self.student)
+        first, second = self.client.get('/api/dashboard/').data['courses']
+        self.assertEqual(first['average'], '16.00')
+        self.assertEqual(second['attendance_rate'], '0.00')
+        self.assertEqual(second['absences'], 1)
+
+    def test_students_only(self):
+        self.client.force_authenticate(self.teacher)
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 403)
@@ -0,0 +1,155 @@
+"""
+Campus Connect - Login limits
+
+Sliding-window limits on failed logins, checked before any password is
+hashed so a flood of guesses is turned away with a 429 instead of
+burning CPU. Only failures are recorded, so a campus NAT full of
+students logging in at once is never held back:
+
+- LoginRateThrottle caps failures per client address.
+- FailedLoginThrottle caps failures per username and address; a
+  successful login clears them, and guessing from one place cannot lock
+  the owner out from another.
+- UsernameLoginThrottle caps failures per username across addresses at
+  a higher rate, which stops guessing spread over many addresses. It
+  does not apply to addresses the user has logged in from, so it cannot
+  lock the owner out either.
+
+The client address is DRF's get_ident, which only trusts
+X-Forwarded-For for the NUM_PROXIES proxies in front of the app. The
+windows live in the default cache.
+
+LoginMetrics counts attempts, hashes and rejections for the admin
+metrics endpoint. The counters live in the process that served the
+requests.
+"""
+
+import threading
+import time
+from collections import Counter, deque
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginMetrics:
+
+    COUNTERS = ('attempts', 'successes', 'failures', 'hashes', 'rejected_by_address', 'rejected_by_username')
+    window = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._hashes = deque()
+
+    def record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def record_hash(self):
+        now = time.monotonic()
+        with self._lock:
+            self._counts['hashes'] += 1
+            self._hashes.append(now)
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._hashes and self._hashes[0] <= now - self.window:
+            self._hashes.popleft()
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            counts = {name: self._counts[name] for name in self.COUNTERS}
+            return {
+                **counts,
+                'hashes_per_second': round(len(self._hashes) / self.window, 2),
+                'window_seconds': self.window,
+            }
+
+
+metrics = LoginMetrics()
+
+
+def get_username(request):
+    username = request.data.get('username') if hasattr(request.data, 'get') else None
+    if not isinstance(username, str) or not username.strip():
+        return None
+    return username.strip().lower()
+
+
+class FailedAttemptThrottle(SimpleRateThrottle):
+    """Counts the failures the view records; checking is not an attempt"""
+
+    metric = None
+
+    def get_ident_for(self, request):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_for(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def throttle_success(self):
+        return True
+
+    def throttle_failure(self):
+        metrics.record(self.metric)
+        return False
+
+    def record_failure(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return
+        now = self.timer()
+        history = [moment for moment in self.cache.get(key, []) if moment > now - self.duration]
+        history.insert(0, now)
+        self.cache.set(key, history, self.duration)
+
+    def record_success(self, request, view):
+        pass
+
+
+class LoginRateThrottle(FailedAttemptThrottle):
+    scope = 'login'
+    metric = 'rejected_by_address'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class FailedLoginThrottle(FailedAttemptThrottle):
+    scope = 'login_failures'
+    metric = 'rejected_by_username'
+
+    def get_ident_for(self, request):
+        username = get_username(request)
+        return f'{username}:{self.get_ident(request)}' if username else None
+
+    def record_success(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is not None:
+            self.cache.delete(key)
+
+
+class UsernameLoginThrottle(FailedAttemptThrottle):
+    scope = 'login_username'
+    metric = 'rejected_by_username'
+    # Seconds an address stays exempt after a successful login from it
+    known_for = 30 * 24 * 3600
+
+    def get_ident_for(self, request):
+        return get_username(request)
+
+    def known_key(self, request):
+        ident = f'{get_username(request)}:{self.get_ident(request)}'
+        return self.cache_format % {'scope': 'login_known', 'ident': ident}
+
+    def allow_request(self, request, view):
+        if get_username(request) and self.cache.get(self.known_key(request)):
+            return True
+        return super().allow_request(request, view)
+
+    def record_success(self, request, view):
+        self.cache.set(self.known_key(request), True, self.known_for)
@@ -12,8 +12,12 @@ urlpatterns = [
     
     path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     
+    path('auth/logout-all/', views.LogoutAllView.as_view(), name='logout-all'),
+    
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
+    path('auth/activate/', views.ActivateAccountView.as_view(), name='activate-account'),
+    
     path('auth/profile/', views.UserProfileView.as_view(), name='profile'),
 
     path('users/search/', views.UserSearchView.as_view(), name='user-search'),
@@ -37,6 +41,11 @@ urlpatterns = [
     
     path('admin/teachers/create/', views.CreateTeacherView.as_view(), name='create-teacher'),
     
+    path('admin/users/import/', views.UserImportView.as_view(), name='user-import'),
+    path('admin/users/import/<int:pk>/', views.UserImportDetailView.as_view(), name='user-import-detail'),
+    
+    path('admin/login-metrics/', views.LoginMetricsView.as_view(), name='login-metrics'),
+    
     path('admin/teachers/<int:pk>/', views.DeleteTeacherView.as_view(), name='delete-teacher'),
     
     
@@ -74,6 +83,10 @@ urlpatterns = [
     
     path('grades/course/<int:course_id>/students/', views.CourseStudentsGradesView.as_view(), name='course-grades'),
     
+    path('grades/course/<int:course_id>/bulk/', views.BulkGradeView.as_view(), name='course-grades-bulk'),
+    
+    path('grades/course/<int:course_id>/statistics/', views.GradeStatisticsView.as_view(), name='course-grades-statistics'),
+    
     
 
     
@@ -102,7 +115,15 @@ urlpatterns = [
 
     path('notifications/', views.NotificationListView.as_view(), name='notifications'),
     path('notifications/<int:pk>/read/', views.NotificationMarkReadView.as_view(), name='notification-mark-read'),
+    path('notifications/mark-read/', views.NotificationBulkReadView.as_view(), name='notification-bulk-read'),
+    path('notifications/announcements/', views.AnnouncementListCreateView.as_view(), name='announcement-list'),
+    path('notifications/announcements/<int:pk>/', views.AnnouncementDetailView.as_view(), name='announcement-detail'),
+    path('unread-counts/', views.UnreadCountsView.as_view(), name='unread-counts'),
+    path('dashboard/', views.StudentDashboardView.as_view(), name='student-dashboard'),
     path('messages/', views.MessageListCreateView.as_view(), name='messages'),
+    path('messages/conversations/', views.ConversationListView.as_view(), name='conversations'),
+    path('messages/mark-read/', views.MessageBulkReadView.as_view(), name='message-bulk-read'),
+    path('stream/', views.EventStreamView.as_view(), name='event-stream'),
     
 
     path('schedule/', views.ScheduleSessionViewSet.as_view({'get': 'list', 'post': 'create'}), name='schedule-list'),
@@ -2,17 +2,39 @@
 Campus Connect - API Views
 """
 
+import asyncio
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import generics, status, permissions, filters, viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession
+from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Conversation, Notification, Announcement, ScheduleSession, UserImport
 from .serializers import *
 from .permissions import IsAdmin, IsTeacher, IsStudent, IsApprovedStudent
+from .mixins import CachedListMixin, ConditionalGetMixin, EagerLoadingViewMixin
+from .authentication import CachedJWTAuthentication, ClaimsRefreshToken, revoke, revoke_all
+from .filters import GradeFilter, NullsLastOrderingFilter, TrigramSearchFilter
+from .pagination import KeysetPagination, SearchResultsPagination
+from .throttling import FailedLoginThrottle, LoginRateThrottle, UsernameLoginThrottle, metrics as login_metrics
+from . import caching, counters, dashboard, grade_notifications, provisioning, realtime, tasks
 
 
 # Authentication Views
@@ -33,15 +55,33 @@ class RegisterView(generics.CreateAPIView):
 
 
 class LoginView(APIView):
+    """
+    Log in with username and password
+    
+    Attempts over the failed-login limits (see api/throttling.py) are
+    rejected with 429 before the password is hashed. Hashes made with
+    outdated hasher settings are upgraded by check_password on a
+    successful login.
+    """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginRateThrottle, FailedLoginThrottle, UsernameLoginThrottle]
     
     def post(self, request):
+        login_metrics.record('attempts')
         serializer = LoginSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            if any(error.code == 'invalid_credentials' for error in serializer.errors.get('non_field_errors', [])):
+                login_metrics.record('failures')
+                for throttle in self.get_throttles():
+                    throttle.record_failure(request, self)
+            raise ValidationError(serializer.errors)
         user = serializer.validated_data['user']
+        login_metrics.record('successes')
+        for throttle in self.get_throttles():
+            throttle.record_success(request, self)
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             'access': str(refresh.access_token),
@@ -51,39 +91,84 @@ class LoginView(APIView):
 
 
 class LogoutView(APIView):
+    """
+    Revoke the access token used for this request and, when given in the
+    body, the refresh token
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                token = ClaimsRefreshToken(refresh)
+            except TokenError:
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            if str(token.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            token.blacklist()
+        
+        if request.auth is not None:
+            revoke(request.auth)
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
+class LogoutAllView(APIView):
+    """
+    Log the user out on every device
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        revoke_all(request.user)
+        return Response({'message': 'Logged out on all devices'}, status=status.HTTP_200_OK)
+
+
+class ActivateAccountView(APIView):
+    """
+    Set the first password of an imported account from its activation link
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        serializer = AccountActivationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password'])
+        
+        refresh = ClaimsRefreshToken.for_user(user)
+        
+        return Response({
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'user': UserSerializer(user).data
+        })
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # request.user only holds the token claims
+        return User.objects.select_related('group').get(pk=self.request.user.pk)
 
 
-class UserSearchView(generics.ListAPIView):
+class UserSearchView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = UserSearchSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['first_name', 'last_name', 'username', 'email']
+    filter_backends = [TrigramSearchFilter]
+    pagination_class = SearchResultsPagination
+    search_fields = ['first_name', 'last_name', 'username', 'email', 'student_id']
 
     def get_queryset(self):
-        return User.objects.filter(is_active=True).filter(
-            Q(role=User.STUDENT, is_approved=True) |
-            Q(role=User.TEACHER) |
-            Q(role=User.ADMIN) |
-            Q(is_staff=True) |
-            Q(is_superuser=True)
-        ).exclude(id=self.request.user.id).distinct()
+        return User.objects.filter(is_searchable=True).exclude(id=self.request.user.id)
 
 
 # Admin Views - User Management
 
-class PendingStudentsView(generics.ListAPIView):
+class PendingStudentsView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = StudentDetailSerializer
     permission_classes = [IsAdmin]
     
@@ -102,7 +187,9 @@ class ApproveStudentView(APIView):
             user = User.objects.get(pk=pk)
             user.is_approved = True
             user.rejection_reason = None
-            user.save()
+            with transaction.atomic():
+                user.save()
+                tasks.enqueue('notify_registration', {'user_id': user.pk})
             return Response({
                 'message': f'{user.role.capitalize()} approved successfully',
                 'user': UserSerializer(user).data
@@ -119,7 +206,9 @@ class RejectStudentView(APIView):
             user = User.objects.get(pk=pk)
             user.is_approved = False
             user.rejection_reason = reason
-            user.save()
+            with transaction.atomic():
+                user.save()
+                tasks.enqueue('notify_registration', {'user_id': user.pk})
             return Response({'message': f'{user.role.capitalize()} rejected', 'reason': reason})
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -130,10 +219,10 @@ class DeleteStudentView(generics.DestroyAPIView):
     queryset = User.objects.filter(role=User.STUDENT)
 
 
-class StudentListView(generics.ListAPIView):
+class StudentListView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = StudentDetailSerializer
     permission_classes = [IsAdmin]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_approved', 'group', 'program', 'semester']
     search_fields = ['username', 'first_name', 'last_name', 'email', 'student_id']
     ordering_fields = ['username', 'created_at', 'student_id']
@@ -166,14 +255,80 @@ class AssignStudentToGroupView(APIView):
             return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class TeacherListView(generics.ListAPIView):
+class TeacherListView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = TeacherDetailSerializer
     permission_classes = [IsAdmin]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [TrigramSearchFilter]
     search_fields = ['username', 'first_name', 'last_name', 'email']
     queryset = User.objects.filter(role=User.TEACHER)
 
 
+class LoginMetricsView(APIView):
+    """
+    Login counters and the recent password hash rate for this process
+    """
+    permission_classes = [IsAdmin]
+    
+    def get(self, request):
+        return Response(login_metrics.snapshot())
+
+
+class UserImportView(APIView):
+    """
+    Create student or teacher accounts from an uploaded CSV file
+    
+    Columns: username, email, first_name, last_name, student_id, program,
+    semester, group (by name) and password. With activation=true the
+    password column is not needed and each created row gets a one-time
+    activation_url instead. Returns 202 straight away; the accounts are
+    created in the background and the import reports its progress and
+    every row as created or error.
+    """
+    permission_classes = [IsAdmin]
+    
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'A CSV file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        role = request.data.get('role', User.STUDENT)
+        if role not in (User.STUDENT, User.TEACHER):
+            return Response({'error': 'role must be STUDENT or TEACHER'}, status=status.HTTP_400_BAD_REQUEST)
+        activation = str(request.data.get('activation', '')).lower() in ('1', 'true', 'yes')
+        if not activation and settings.TASKS_EAGER:
+            # Hashing would run in this process, after the request
+            return Response(
+                {'error': 'Importing passwords needs the run_tasks worker; use activation=true or the import_users command'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            rows = provisioning.read_csv(upload.read())
+        except (UnicodeDecodeError, csv.Error):
+            return Response({'error': 'Could not read the CSV file'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user_import = UserImport.objects.create(
+            created_by=request.user,
+            role=role,
+            activation=activation,
+            rows=rows,
+            total=len(rows)
+        )
+        tasks.enqueue('import_users', {'import_id': user_import.pk}, key=f'user-import:{user_import.pk}')
+        
+        # Eager tasks have already run
+        user_import.refresh_from_db()
+        return Response(UserImportSerializer(user_import).data, status=status.HTTP_202_ACCEPTED)
+
+
+class UserImportDetailView(generics.RetrieveAPIView):
+    serializer_class = UserImportSerializer
+    permission_classes = [IsAdmin]
+    
+    def get_queryset(self):
+        return UserImport.objects.filter(created_by=self.request.user)
+
+
 class CreateTeacherView(generics.CreateAPIView):
     permission_classes = [IsAdmin]
     
@@ -212,8 +367,10 @@ class DeleteTeacherView(generics.DestroyAPIView):
 
 # Course Management Views
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(ConditionalGetMixin, CachedListMixin, generics.ListCreateAPIView):
     queryset = Course.objects.all()
+    cache_models = (Course,)
+    etag_models = (Course,)
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['code', 'name']
@@ -230,9 +387,10 @@ class CourseListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    etag_models = (Course,)
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -240,22 +398,25 @@ class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class TeacherCoursesView(generics.ListAPIView):
+class TeacherCoursesView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsTeacher]
+    etag_models = (CourseAssignment, Course, Group, User, ScheduleSession)
     
     def get_queryset(self):
         return CourseAssignment.objects.filter(teacher=self.request.user)
 
 
-class StudentCoursesView(generics.ListAPIView):
+class StudentCoursesView(ConditionalGetMixin, CachedListMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsStudent]
+    cache_models = (CourseAssignment, Course, Group, User, ScheduleSession)
+    etag_models = (CourseAssignment, Course, Group, User, ScheduleSession)
     
     def get_queryset(self):
         student = self.request.user
-        if student.group:
-            return CourseAssignment.objects.filter(group=student.group)
+        if student.group_id:
+            return CourseAssignment.objects.filter(group_id=student.group_id)
         return CourseAssignment.objects.none()
 
 
@@ -284,9 +445,11 @@ class AssignCourseToGroupView(APIView):
 
 # Group Management Views
 
-class GroupListCreateView(generics.ListCreateAPIView):
+class GroupListCreateView(ConditionalGetMixin, CachedListMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    cache_models = (Group, Course, User)
+    etag_models = (Group, Course, User)
     
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -294,9 +457,10 @@ class GroupListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
+class GroupDetailView(ConditionalGetMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    etag_models = (Group, Course, User)
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -306,34 +470,43 @@ class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # Course Assignment Views
 
-class CourseAssignmentListCreateView(generics.ListCreateAPIView):
+class CourseAssignmentListCreateView(ConditionalGetMixin, CachedListMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = CourseAssignment.objects.all()
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsAdmin]
+    cache_models = (CourseAssignment, Course, Group, User, ScheduleSession)
+    etag_models = (CourseAssignment, Course, Group, User, ScheduleSession)
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['group', 'teacher', 'course']
 
 
-class CourseAssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseAssignmentDetailView(ConditionalGetMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CourseAssignment.objects.all()
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsAdmin]
+    etag_models = (CourseAssignment, Course, Group, User, ScheduleSession)
 
 
 # Grade Management Views
 
-class GradeListCreateView(generics.ListCreateAPIView):
+class GradeListCreateView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsTeacher]
+    etag_models = (Course, User)
+    etag_updated_field = 'updated_at'
+    filter_backends = [DjangoFilterBackend, NullsLastOrderingFilter]
+    filterset_class = GradeFilter
+    ordering_fields = ['average', 'td_mark', 'tp_mark', 'exam_mark', 'updated_at']
     
     def get_queryset(self):
         queryset = Grade.objects.all()
         
+        course_id = self.request.query_params.get('course_id')
         if course_id:
             queryset = queryset.filter(course_id=course_id)
         
         if self.request.user.role == User.TEACHER:
-            queryset = queryset.filter(course__teacher=self.request.user)
+            queryset = queryset.filter(course__assignments__teacher=self.request.user).distinct()
         
         return queryset
 
@@ -344,45 +517,158 @@ class GradeUpdateView(generics.UpdateAPIView):
     permission_classes = [IsTeacher]
     
     def get_queryset(self):
-        return Grade.objects.filter(course__teacher=self.request.user)
+        return Grade.objects.filter(course__assignments__teacher=self.request.user).distinct()
 
 
-class StudentGradesView(generics.ListAPIView):
+class StudentGradesView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsStudent]
+    etag_models = (Course, User)
+    etag_updated_field = 'updated_at'
+    filter_backends = [DjangoFilterBackend, NullsLastOrderingFilter]
+    filterset_class = GradeFilter
+    ordering_fields = ['average', 'td_mark', 'tp_mark', 'exam_mark', 'updated_at']
     
     def get_queryset(self):
         return Grade.objects.filter(student=self.request.user)
 
 
-class CourseStudentsGradesView(generics.ListAPIView):
+class CourseStudentsGradesView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsTeacher]
+    etag_models = (Course, User)
+    etag_updated_field = 'updated_at'
+    filter_backends = [DjangoFilterBackend, NullsLastOrderingFilter]
+    filterset_class = GradeFilter
+    ordering_fields = ['average', 'td_mark', 'tp_mark', 'exam_mark', 'updated_at']
+    
+    @cached_property
+    def assignment(self):
+        assignment = get_object_or_404(CourseAssignment, pk=self.kwargs['course_id'], teacher=self.request.user)
+        
+        # Rows for students who joined the group since the last visit
+        Grade.objects.materialize(assignment.course_id, assignment.group_id)
+        return assignment
     
     def get_queryset(self):
-        assignment_id = self.kwargs['course_id']
+        assignment = self.assignment
+        return Grade.objects.filter(course_id=assignment.course_id, student__group_id=assignment.group_id)
+
+
+class BulkGradeView(APIView):
+    """
+    Save a whole mark sheet for one of the teacher's course assignments
+    
+    Accepts {"grades": [...]} as JSON or an uploaded CSV file with the
+    columns student, td_mark, tp_mark, exam_mark and comments. Blank CSV
+    cells leave the stored value unchanged.
+    """
+    permission_classes = [IsTeacher]
+    
+    def get_records(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return request.data.get('grades', []) if isinstance(request.data, dict) else None
         
-        assignment = get_object_or_404(CourseAssignment, pk=assignment_id, teacher=self.request.user)
-        course = assignment.course
-        group = assignment.group
+        rows = csv.DictReader(io.StringIO(upload.read().decode('utf-8-sig')))
+        return [{key: value for key, value in row.items() if key and value not in (None, '')} for row in rows]
+    
+    def post(self, request, course_id):
+        assignment = get_object_or_404(CourseAssignment, pk=course_id, teacher=request.user)
         
-        students = User.objects.filter(
-            role=User.STUDENT,
-            group=group
-        )
+        try:
+            records = self.get_records(request)
+        except (UnicodeDecodeError, csv.Error):
+            return Response({'error': 'Could not read the CSV file'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(records, list):
+            return Response({'error': 'grades must be a list'}, status=status.HTTP_400_BAD_REQUEST)
         
-        for student in students:
-            Grade.objects.get_or_create(
-                student=student,
-                course=course
-            )
+        valid = []
+        errors = []
+        for index, data in enumerate(records):
+            serializer = BulkGradeRecordSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        now = timezone.now()
+        changed = {}
+        with transaction.atomic():
+            Grade.objects.materialize(assignment.course_id, assignment.group_id)
+            # Lock only the grade rows, not the students joined for the group
+            grades = {
+                grade.student_id: grade
+                for grade in Grade.objects.select_for_update(of=('self',)).filter(
+                    course_id=assignment.course_id,
+                    student__group_id=assignment.group_id,
+                    student_id__in={record['student'] for _, record in valid}
+                )
+            }
+            
+            for index, record in valid:
+                grade = grades.get(record.pop('student'))
+                if grade is None:
+                    errors.append({'index': index, 'errors': {'student': ['Student is not in this group']}})
+                    continue
+                
+                for field, value in record.items():
+                    setattr(grade, field, value)
+                grade.updated_at = now
+                grade.notification_pending = grade.notification_pending or grade.has_marks()
+                changed[grade.pk] = grade
+            
+            if changed:
+                Grade.objects.bulk_update(
+                    changed.values(),
+                    [*Grade.MARK_FIELDS, 'comments', 'updated_at', 'notification_pending']
+                )
+                # bulk_update skips post_save
+                grade_notifications.schedule()
+                caching.bump(Grade, owners={grade.student_id for grade in changed.values()})
+            else:
+                # Nothing was saved, so leave the table as it was
+                transaction.set_rollback(True)
+        
+        averages = Grade.objects.filter(
+            course_id=assignment.course_id,
+            student__group_id=assignment.group_id
+        ).values('id', 'student', 'average')
         
-        return Grade.objects.filter(course=course, student__group=group)
+        return Response({
+            'updated': len(changed),
+            'errors': sorted(errors, key=lambda error: error['index']),
+            'averages': GradeAverageSerializer(averages, many=True).data
+        })
+
+
+class GradeStatisticsView(APIView):
+    """
+    Class-wide statistics for one of the teacher's course assignments
+    """
+    permission_classes = [IsTeacher]
+    
+    def get(self, request, course_id):
+        assignment = get_object_or_404(CourseAssignment, pk=course_id, teacher=request.user)
+        
+        stats = Grade.objects.filter(
+            course_id=assignment.course_id,
+            student__group_id=assignment.group_id
+        ).aggregate(
+            students=Count('id'),
+            graded=Count('id', filter=Q(average__isnull=False)),
+            below_ten=Count('id', filter=Q(average__lt=10)),
+            mean=Avg('average'),
+            highest=Max('average'),
+            lowest=Min('average')
+        )
+        
+        return Response(stats)
 
 
 # Attendance Views
 
-class AttendanceListCreateView(generics.ListCreateAPIView):
+class AttendanceListCreateView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsTeacher]
     
@@ -403,34 +689,83 @@ class AttendanceListCreateView(generics.ListCreateAPIView):
 
 
 class BulkAttendanceView(APIView):
+    """
+    Upsert a whole roll call in one transaction
+    
+    Each course is authorized once per request and every record is
+    validated up front; rejected records are reported by index.
+    """
     permission_classes = [IsTeacher]
     
     def post(self, request):
-        records = request.data.get('attendance', [])
-        results = []
-        for data in records:
-            student_id = data.get('student')
-            course_id = data.get('course')
-            week_number = data.get('week_number')
-            
-            if not CourseAssignment.objects.filter(course_id=course_id, teacher=request.user).exists():
+        records = request.data.get('attendance', []) if isinstance(request.data, dict) else None
+        if not isinstance(records, list):
+            return Response({'error': 'attendance must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        valid = []
+        errors = []
+        for index, data in enumerate(records):
+            serializer = BulkAttendanceRecordSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        allowed_courses = set(CourseAssignment.objects.filter(
+            teacher=request.user,
+            course_id__in={record['course'] for _, record in valid}
+        ).values_list('course_id', flat=True))
+        known_students = set(User.objects.filter(
+            role=User.STUDENT,
+            pk__in={record['student'] for _, record in valid}
+        ).values_list('pk', flat=True))
+        
+        # Keyed on the unique constraint so a repeated record overrides the earlier one
+        rows = {}
+        for index, record in valid:
+            if record['course'] not in allowed_courses:
+                errors.append({'index': index, 'errors': {'course': ['You are not assigned to this course']}})
                 continue
-                
-            attendance, created = Attendance.objects.update_or_create(
-                student_id=student_id,
-                course_id=course_id,
-                week_number=week_number,
-                defaults={
-                    'status': data.get('status'),
-                    'notes': data.get('notes', '')
-                }
+            if record['student'] not in known_students:
+                errors.append({'index': index, 'errors': {'student': ['Student not found']}})
+                continue
+            
+            key = (record['student'], record['course'], record['week_number'])
+            rows[key] = Attendance(
+                student_id=record['student'],
+                course_id=record['course'],
+                week_number=record['week_number'],
+                status=record['status'],
+                notes=record['notes']
             )
-            results.append(AttendanceSerializer(attendance).data)
+        
+        results = []
+        if rows:
+            with transaction.atomic():
+                Attendance.objects.bulk_create(
+                    rows.values(),
+                    update_conflicts=True,
+                    unique_fields=['student', 'course', 'week_number'],
+                    update_fields=['status', 'notes']
+                )
+                # bulk_create skips post_save
+                caching.bump(Attendance, owners={key[0] for key in rows})
             
-        return Response(results, status=status.HTTP_200_OK)
+            saved = AttendanceSerializer.setup_eager_loading(Attendance.objects.filter(
+                student_id__in={key[0] for key in rows},
+                course_id__in={key[1] for key in rows},
+                week_number__in={key[2] for key in rows}
+            ))
+            results = AttendanceSerializer(
+                [attendance for attendance in saved
+                 if (attendance.student_id, attendance.course_id, attendance.week_number) in rows],
+                many=True
+            ).data
+        
+        return Response({'results': results, 'errors': sorted(errors, key=lambda error: error['index'])}, status=status.HTTP_200_OK)
 
 
-class StudentAttendanceView(generics.ListAPIView):
+class StudentAttendanceView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsStudent]
     
@@ -440,7 +775,7 @@ class StudentAttendanceView(generics.ListAPIView):
 
 # File Management Views
 
-class CourseFileListCreateView(generics.ListCreateAPIView):
+class CourseFileListCreateView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = CourseFileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -452,13 +787,13 @@ class CourseFileListCreateView(generics.ListCreateAPIView):
             queryset = queryset.filter(course_id=course_id)
         
         if self.request.user.role == User.STUDENT:
-            if self.request.user.group:
-                queryset = queryset.filter(course__groups=self.request.user.group)
+            if self.request.user.group_id:
+                queryset = queryset.filter(course__groups=self.request.user.group_id)
             else:
                 queryset = CourseFile.objects.none()
         
         elif self.request.user.role == User.TEACHER:
-            queryset = queryset.filter(course__teacher=self.request.user)
+            queryset = queryset.filter(course__assignments__teacher=self.request.user).distinct()
         
         return queryset
     
@@ -466,7 +801,7 @@ class CourseFileListCreateView(generics.ListCreateAPIView):
         serializer.save(uploaded_by=self.request.user)
 
 
-class CourseFileDetailView(generics.RetrieveDestroyAPIView):
+class CourseFileDetailView(EagerLoadingViewMixin, generics.RetrieveDestroyAPIView):
     queryset = CourseFile.objects.all()
     serializer_class = CourseFileSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -486,8 +821,9 @@ class CourseFileDetailView(generics.RetrieveDestroyAPIView):
 
 # Timetable Views
 
-class TimetableListCreateView(generics.ListCreateAPIView):
+class TimetableListCreateView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = TimetableSerializer
+    etag_models = (Timetable, Group)
     
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -498,21 +834,22 @@ class TimetableListCreateView(generics.ListCreateAPIView):
         queryset = Timetable.objects.filter(is_active=True)
         
         if self.request.user.role == User.STUDENT:
-            if self.request.user.group:
-                queryset = queryset.filter(group=self.request.user.group)
+            if self.request.user.group_id:
+                queryset = queryset.filter(group_id=self.request.user.group_id)
             else:
                 queryset = Timetable.objects.none()
         
         return queryset
 
 
-class TimetableDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TimetableDetailView(ConditionalGetMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Get, Update, or Delete a timetable
     """
     
     queryset = Timetable.objects.all()
     serializer_class = TimetableSerializer
+    etag_models = (Timetable, Group)
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -520,7 +857,7 @@ class TimetableDetailView(generics.RetrieveUpdateDestroyAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class StudentTimetableView(APIView):
+class StudentTimetableView(ConditionalGetMixin, APIView):
     """
     Get current student's active timetable
     
@@ -528,18 +865,22 @@ class StudentTimetableView(APIView):
     """
     
     permission_classes = [IsStudent]
+    etag_models = (Timetable, Group)
     
     def get(self, request):
+        return self.conditional_response(request, self.get_timetable)
+    
+    def get_timetable(self, request):
         student = request.user
         
-        if not student.group:
+        if not student.group_id:
             return Response(
                 {'message': 'You are not assigned to any group yet'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        timetable = Timetable.objects.filter(
-            group=student.group,
+        timetable = Timetable.objects.select_related('group').filter(
+            group_id=student.group_id,
             is_active=True
         ).first()
         
@@ -560,6 +901,8 @@ class NotificationListView(generics.ListAPIView):
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
@@ -572,18 +915,103 @@ class NotificationMarkReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        notification = get_object_or_404(Notification, pk=pk, user=request.user)
-        notification.is_read = True
-        notification.save()
+        notifications = Notification.objects.filter(pk=pk, user=request.user)
+        if notifications.filter(is_read=False).update(is_read=True):
+            counters.adjust('notifications', request.user.pk, -1)
+        else:
+            get_object_or_404(notifications)
         return Response({'status': 'notification marked as read'})
 
 
-class MessageListCreateView(generics.ListCreateAPIView):
+class NotificationBulkReadView(APIView):
+    """
+    Mark many notifications read with a single UPDATE
+    
+    Accepts any combination of `ids`, `up_to` (an id) and `type`.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = NotificationMarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        notifications = Notification.objects.filter(user=request.user, is_read=False)
+        if 'ids' in data:
+            notifications = notifications.filter(pk__in=data['ids'])
+        if 'up_to' in data:
+            notifications = notifications.filter(pk__lte=data['up_to'])
+        if 'type' in data:
+            notifications = notifications.filter(notification_type=data['type'])
+        
+        updated = notifications.update(is_read=True)
+        if updated:
+            counters.adjust('notifications', request.user.pk, -updated)
+        return Response({'updated': updated})
+
+
+class AnnouncementListCreateView(generics.ListCreateAPIView):
+    """
+    Send a notification to a group, a course, a role or everyone
+    
+    Returns 202 straight away; the notifications are written in the
+    background and the announcement reports its progress.
+    """
+    serializer_class = AnnouncementSerializer
+    permission_classes = [IsAdmin | IsTeacher]
+
+    def get_queryset(self):
+        return Announcement.objects.filter(created_by=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        announcement = serializer.save(created_by=self.request.user)
+        tasks.enqueue('deliver_announcement', {'announcement_id': announcement.pk}, key=f'announcement:{announcement.pk}')
+
+
+class AnnouncementDetailView(generics.RetrieveAPIView):
+    serializer_class = AnnouncementSerializer
+    permission_classes = [IsAdmin | IsTeacher]
+
+    def get_queryset(self):
+        return Announcement.objects.filter(created_by=self.request.user)
+
+
+class StudentDashboardView(APIView):
+    """
+    Everything the student home screen shows, in one request
+    
+    Courses with their teacher, the student's average and attendance
+    rate in each, the active timetable and the unread counts.
+    """
+    permission_classes = [IsStudent]
+
+    def get(self, request):
+        return Response(dashboard.get(request.user))
+
+
+class UnreadCountsView(APIView):
+    """
+    Badge counts of unread notifications and messages
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(counters.get_unread_counts(request.user.pk))
+
+
+class MessageListCreateView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     """
     List messages with a specific user or send a new message
     """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('timestamp', 'id')
 
     def get_queryset(self):
         other_user_id = self.request.query_params.get('with_user')
@@ -599,26 +1027,123 @@ class MessageListCreateView(generics.ListCreateAPIView):
         )
 
     def perform_create(self, serializer):
-        message = serializer.save(sender=self.request.user)
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user)
+            Conversation.objects.record(message)
+            
+            # Create a notification for the receiver
+            tasks.enqueue('notify_message', {'message_id': message.pk}, key=f'message:{message.pk}')
+
+
+class MessageBulkReadView(APIView):
+    """
+    Mark received messages read with a single UPDATE
+    
+    Accepts `with_user` to limit it to one conversation and `up_to` (an
+    id) to stop at the last message the client has shown.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MessageMarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
         
-        # Create a notification for the receiver
-        sender = self.request.user
-        sender_display_name = sender.get_full_name().strip() or sender.username
+        messages = Message.objects.filter(receiver=request.user, is_read=False)
+        conversations = Conversation.objects.filter(owner=request.user)
+        if 'with_user' in data:
+            messages = messages.filter(sender_id=data['with_user'])
+            conversations = conversations.filter(peer_id=data['with_user'])
+        if 'up_to' in data:
+            messages = messages.filter(pk__lte=data['up_to'])
         
-        Notification.objects.create(
-            user=message.receiver,
-            title=f"New Message from {sender_display_name}",
-            message=message.content[:100] + ("..." if len(message.content) > 100 else ""),
-            notification_type='MESSAGE'
-        )
+        with transaction.atomic():
+            updated = messages.update(is_read=True)
+            if updated:
+                still_unread = Message.objects.filter(
+                    receiver=request.user,
+                    sender=OuterRef('peer'),
+                    is_read=False
+                ).values('receiver').annotate(total=Count('pk')).values('total')
+                conversations.update(unread_count=Coalesce(Subquery(still_unread), Value(0)))
+                counters.adjust('messages', request.user.pk, -updated)
+        
+        return Response({'updated': updated})
+
+
+class ConversationListView(EagerLoadingViewMixin, generics.ListAPIView):
+    """
+    Inbox: one row per peer with the last message and unread count
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Conversation.objects.filter(owner=self.request.user)
 
 
-class ScheduleSessionViewSet(viewsets.ModelViewSet):
+class ScheduleSessionViewSet(ConditionalGetMixin, CachedListMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
     """
     CRUD for class schedule sessions.
     """
     queryset = ScheduleSession.objects.all()
     serializer_class = ScheduleSessionSerializer
     permission_classes = [IsAdmin]
+    cache_models = (ScheduleSession, CourseAssignment, Course, Group, User)
+    etag_models = (ScheduleSession, CourseAssignment, Course, Group, User)
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['assignment__group', 'day']
+
+
+# Real-time Views
+
+class EventStreamView(View):
+    """
+    Server-sent event stream of the current user's new messages and
+    notifications. The access token comes from the Authorization header
+    only, so it never ends up in access logs.
+
+    The stream never ends, so it needs the ASGI application
+    (backend/asgi.py) served by an ASGI server such as uvicorn; under
+    WSGI, runserver included, Django would buffer it forever and send
+    nothing, so the request is refused instead.
+    """
+
+    def authenticate(self, request):
+        authenticator = CachedJWTAuthentication()
+        header = authenticator.get_header(request)
+        raw_token = authenticator.get_raw_token(header) if header else None
+        if not raw_token:
+            return None
+        try:
+            user = authenticator.get_user(authenticator.get_validated_token(raw_token))
+        except (AuthenticationFailed, TokenError):
+            return None
+        return user
+
+    async def get(self, request):
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        if isinstance(request, WSGIRequest):
+            return JsonResponse({'detail': 'The event stream needs the ASGI server.'}, status=501)
+
+        response = StreamingHttpResponse(self.stream(user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, user_id):
+        broker = realtime.get_broker()
+        subscription = broker.subscribe(user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.REALTIME_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
@@ -2,6 +2,7 @@
 Campus Connect - Django Settings
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -23,10 +24,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'api',
 ]
 
@@ -48,7 +51,7 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -59,6 +62,16 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ],
     'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
+    # Failed-login limits, see api/throttling.py: per client address, per
+    # username and address, and per username from unknown addresses
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '120/min',
+        'login_failures': '10/hour',
+        'login_username': '100/hour',
+    },
+    # Reverse proxies in front of the app; X-Forwarded-For is only trusted
+    # for that many hops, and with 0 the client address is REMOTE_ADDR
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
 
@@ -79,9 +92,79 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.ClaimsTokenRefreshSerializer',
 }
 
 
+# Cache shared by the auth, counter, throttle and catalog layers. The
+# local-memory default is per process; point CACHE_URL at Redis when
+# running more than one process, e.g. redis://localhost:6379/0 (needs
+# the redis package from requirements.txt)
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds catalog responses (courses, groups, assignments, schedules)
+# stay cached, see api/caching.py
+CATALOG_CACHE_TTL = 3600
+
+# Seconds a student's dashboard stays cached, see api/dashboard.py
+DASHBOARD_CACHE_TTL = 600
+
+# Seconds an authenticated user is served from the cache, see api/authentication.py
+AUTH_USER_CACHE_TTL = 60
+
+
+# Real-time push, see api/realtime.py
+REALTIME_BROKER = 'api.realtime.PostgresBroker'
+REALTIME_QUEUE_SIZE = 100
+REALTIME_KEEPALIVE_SECONDS = 15
+
+# Seconds before cached unread counters are recounted, see api/counters.py
+UNREAD_COUNT_TTL = 300
+
+# Announcement fan-out, see api/announcements.py
+ANNOUNCEMENT_BATCH_SIZE = 500
+
+# Background tasks, see api/tasks.py. With a shared cache (CACHE_URL),
+# run `python manage.py run_tasks` next to the web server. Without one,
+# the web processes run them eagerly after each request commits, as a
+# worker's counter updates would not reach them until UNREAD_COUNT_TTL.
+TASKS_EAGER = not os.environ.get('CACHE_URL')
+TASK_BATCH_SIZE = 10
+TASK_POLL_INTERVAL = 2
+TASK_RETRY_DELAY = 30
+TASK_TIMEOUT = 600
+# Seconds finished tasks are kept, and how often they are pruned
+TASK_RETENTION = 7 * 24 * 3600
+TASK_PRUNE_INTERVAL = 3600
+
+# Bulk user import, see api/provisioning.py. USER_IMPORT_WORKERS processes
+# hash passwords for the import_users command and for admin imports, which
+# run in the run_tasks worker. Imported users without a password get a
+# link built from ACCOUNT_ACTIVATION_URL; the client posts its uid and
+# token with the new password to api/auth/activate/.
+USER_IMPORT_WORKERS = os.cpu_count() or 1
+USER_IMPORT_BATCH_SIZE = 500
+ACCOUNT_ACTIVATION_URL = '/activate/{uid}/{token}/'
+
+# Seconds over which grade edits are coalesced into one notification per
+# student and course, see api/grade_notifications.py
+GRADE_NOTIFICATION_WINDOW = 300
+GRADE_NOTIFICATION_BATCH_SIZE = 500
+
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 